@@ -8,12 +8,29 @@ Run this BEFORE PyInstaller build:
 import os
 import sys
 
-def generate_with_cairosvg():
-    """High-quality SVG → ICO using cairosvg"""
+SIZES = [16, 24, 32, 48, 64, 128, 256]
+
+
+def render_svg(svg_data, size):
+    """Rasterise SVG bytes at size x size with cairosvg"""
     import cairosvg
     from PIL import Image
     import io
+    png_data = cairosvg.svg2png(bytestring=svg_data, output_width=size, output_height=size)
+    return Image.open(io.BytesIO(png_data)).convert('RGBA')
+
 
+def cairosvg_icon_sizes(svg_data, sizes=SIZES):
+    """Render the largest size once and derive the others from it"""
+    from keycap_slicer_bridge import derive_icon_sizes
+    # Vector rasterisation has no per-size stroke clamping, so every size
+    # (not just those >= ICON_DERIVE_MIN) is downsampled from the master
+    derived = derive_icon_sizes(render_svg(svg_data, max(sizes)), sizes)
+    return [derived[sz] for sz in sizes]
+
+
+def generate_with_cairosvg():
+    """High-quality SVG → ICO using cairosvg (256px master rendered once, rest derived)"""
     svg_path = os.path.join(os.path.dirname(__file__), "keycapgeneratorIcon.svg")
     if not os.path.exists(svg_path):
         print(f"Error: {svg_path} not found")
@@ -22,12 +39,9 @@ def generate_with_cairosvg():
     with open(svg_path, 'rb') as f:
         svg_data = f.read()
 
-    sizes = [16, 24, 32, 48, 64, 128, 256]
-    images = []
+    sizes = SIZES
+    images = cairosvg_icon_sizes(svg_data, sizes)
     for sz in sizes:
-        png_data = cairosvg.svg2png(bytestring=svg_data, output_width=sz, output_height=sz)
-        img = Image.open(io.BytesIO(png_data)).convert('RGBA')
-        images.append(img)
         print(f"  Generated {sz}x{sz}")
 
     ico_path = os.path.join(os.path.dirname(__file__), "icon.ico")
@@ -36,12 +50,11 @@ def generate_with_cairosvg():
     return ico_path
 
 def generate_with_pillow():
-    """Fallback: PIL polygon drawing"""
-    from keycap_slicer_bridge import create_keycap_icon
-    from PIL import Image
+    """Fallback: PIL polygon drawing (largest size rendered once, rest derived)"""
+    from keycap_slicer_bridge import create_keycap_icon, render_icon_sizes
 
-    sizes = [16, 24, 32, 48, 64, 128, 256]
-    images = [create_keycap_icon(sz) for sz in sizes]
+    sizes = SIZES
+    images = render_icon_sizes(sizes, render=create_keycap_icon)
 
     ico_path = os.path.join(os.path.dirname(__file__), "icon.ico")
     images[0].save(ico_path, format='ICO', sizes=[(s, s) for s in sizes], append_images=images[1:])
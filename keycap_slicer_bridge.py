@@ -4,22 +4,27 @@ Keycap Slicer Bridge v2.1
 ブラウザ(Keycap Generator)からスライサーへモデルを直接転送するブリッジアプリ
 """
 
+import time
+_STARTUP_T0 = time.perf_counter()
+
 import os
 import sys
 import json
+import atexit
+import hashlib
+import queue
 import tempfile
-import subprocess
 import threading
-import time
 import shutil
-from http.server import HTTPServer, BaseHTTPRequestHandler
-try:
-    import cgi
-except ImportError:
-    cgi = None
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 import io
 import re
-import zipfile
+import struct
+import zlib
+import bisect
+from stat import S_ISDIR, S_ISREG
+# zipfile, subprocess and xml.etree are imported where used: none of them
+# is needed before the listener is up, and they dominate import time.
 
 # === Configuration ===
 PORT = 19876
@@ -57,6 +62,7 @@ SLICER_PATHS = {
 
 
 ALLOWED_EXTENSIONS = {'.stl', '.3mf', '.obj', '.step', '.stp'}
+MAX_UPLOAD_BYTES = 100 * 1024 * 1024
 
 # =====================================================
 # Project Filament Scanner v2.5
@@ -67,9 +73,6 @@ ALLOWED_EXTENSIONS = {'.stl', '.3mf', '.obj', '.step', '.stp'}
 # BambuStudio.conf          → JSON (25KB+, may have extra data after main object)
 # =====================================================
 
-import xml.etree.ElementTree as ET
-
-
 
 def _normalize_hex(v):
     """Normalize hex color string to #RRGGBB uppercase."""
@@ -91,6 +94,75 @@ def _normalize_hex(v):
     return ''
 
 
+# ── Filament records ──
+
+class FilamentRecord:
+    """One project filament slot, as produced by every extractor.
+    `used`, `used_g` and `used_m` are only set by sources that report
+    them (slice_info)."""
+    __slots__ = ('slot', 'name', 'color', 'type', 'vendor', 'used', 'used_g', 'used_m')
+    OPTIONAL = ('used', 'used_g', 'used_m')
+
+    def __init__(self, slot, name, color, type='PLA', vendor='', used=None,
+                 used_g=None, used_m=None):
+        self.slot = slot
+        self.name = name
+        self.color = color
+        self.type = type
+        self.vendor = vendor
+        self.used = used
+        self.used_g = used_g
+        self.used_m = used_m
+
+    def to_dict(self):
+        d = {'slot': self.slot, 'name': self.name, 'color': self.color,
+             'type': self.type, 'vendor': self.vendor}
+        for f in self.OPTIONAL:
+            v = getattr(self, f)
+            if v is not None:
+                d[f] = v
+        return d
+
+    def to_row(self):
+        """Compact positional form for the state snapshot and content hashes."""
+        row = [self.slot, self.name, self.color, self.type, self.vendor,
+               self.used, self.used_g, self.used_m]
+        while len(row) > 5 and row[-1] is None:
+            row.pop()
+        return row
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(*row)
+
+    def __eq__(self, other):
+        return isinstance(other, FilamentRecord) and self.to_row() == other.to_row()
+
+    # Mutable (plates are merged in place), so unhashable like the dicts it replaced
+    __hash__ = None
+
+    def __repr__(self):
+        return f'FilamentRecord{tuple(self.to_row())!r}'
+
+
+def _json_default(obj):
+    if isinstance(obj, FilamentRecord):
+        return obj.to_dict()
+    raise TypeError(f'{type(obj).__name__} is not JSON serializable')
+
+
+def _json_digest_default(obj):
+    if isinstance(obj, FilamentRecord):
+        return obj.to_row()
+    raise TypeError(f'{type(obj).__name__} is not JSON serializable')
+
+
+# Response bodies, SSE events and content hashes share these encoders
+_json_encoder = json.JSONEncoder(ensure_ascii=False, default=_json_default)
+_json_digest_encoder = json.JSONEncoder(ensure_ascii=False, sort_keys=True,
+                                        default=_json_digest_default)
+
+
 def _try_read_file(path, max_bytes=50*1024*1024):
     """Read text file with encoding fallbacks. Default 50MB."""
     for enc in ('utf-8-sig', 'utf-8', 'cp932', 'latin-1'):
@@ -104,6 +176,75 @@ def _try_read_file(path, max_bytes=50*1024*1024):
     return None
 
 
+# ── Request-scoped I/O memo ──
+
+class ScanIO:
+    """Reads and stats memoised by path for the duration of one scan.
+    The strategies overlap (last_backup_path normally lives under the temp
+    model root, and the conf is stat'ed by several layers), so each file
+    is read once per request."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._texts = {}
+        self._stats = {}
+        self.counts = {'reads': 0, 'reads_saved': 0, 'chars_saved': 0,
+                       'stats': 0, 'stats_saved': 0}
+
+    @staticmethod
+    def _key(path):
+        return os.path.normcase(os.path.abspath(path))
+
+    def stat(self, path):
+        """os.stat result, or None if the path does not exist."""
+        key = self._key(path)
+        with self._lock:
+            if key in self._stats:
+                self.counts['stats_saved'] += 1
+                return self._stats[key]
+        try:
+            st = os.stat(path)
+        except OSError:
+            st = None
+        with self._lock:
+            self.counts['stats'] += 1
+            self._stats[key] = st
+        return st
+
+    def isfile(self, path):
+        st = self.stat(path)
+        return st is not None and S_ISREG(st.st_mode)
+
+    def isdir(self, path):
+        st = self.stat(path)
+        return st is not None and S_ISDIR(st.st_mode)
+
+    def getmtime(self, path):
+        st = self.stat(path)
+        if st is None:
+            raise FileNotFoundError(path)
+        return st.st_mtime
+
+    def read_text(self, path):
+        """_try_read_file, once per path."""
+        key = self._key(path)
+        with self._lock:
+            if key in self._texts:
+                text = self._texts[key]
+                self.counts['reads_saved'] += 1
+                self.counts['chars_saved'] += len(text or '')
+                return text
+        text = _try_read_file(path)
+        with self._lock:
+            self.counts['reads'] += 1
+            self._texts[key] = text
+        return text
+
+    def report(self):
+        with self._lock:
+            return dict(self.counts)
+
+
 def _try_parse_json(text):
     """Parse JSON tolerantly (trailing commas, comments, extra data after JSON)."""
     if not text:
@@ -152,20 +293,65 @@ def _try_parse_json(text):
     return None, err1
 
 
-def _read_conf(slicer_type):
-    """Read BambuStudio.conf FULLY (no byte truncation) → (dict, path, error)."""
+def _conf_path(slicer_type):
     app = 'BambuStudio' if slicer_type != 'orca' else 'OrcaSlicer'
-    appdata = os.environ.get('APPDATA', '')
-    conf_path = os.path.join(appdata, app, f'{app}.conf')
-    if not os.path.isfile(conf_path):
+    return os.path.join(os.environ.get('APPDATA', ''), app, f'{app}.conf')
+
+
+# ── Conf tokenizer ──
+# A slicer .conf is a JSON object optionally followed by INI [sections]
+# (and an MD5 trailer). One pass: raw_decode the JSON prefix, then find
+# section headers and key = value lines from its end index with compiled
+# patterns over the same buffer (pos/endpos, no slicing of the text).
+
+_json_decoder = json.JSONDecoder()
+_CONF_WS_RE = re.compile(r'\s*')
+_CONF_SECTION_RE = re.compile(r'^[ \t]*\[([^\]\r\n]+)\][ \t]*\r?$', re.M)
+_CONF_KV_RE = re.compile(r'^[ \t]*([^\s{}=][^\n=]*)=([^\n]*)$', re.M)
+
+
+def tokenize_conf(text):
+    """Split conf text → {'json', 'json_error', 'json_end', 'sections'}.
+    sections is {lowercased name: {key: value}} for the INI tail."""
+    start = 1 if text.startswith('\ufeff') else 0
+    idx = _CONF_WS_RE.match(text, start).end()
+    try:
+        data, end = _json_decoder.raw_decode(text, idx)
+        err = None
+    except json.JSONDecodeError:
+        # Not clean JSON: the tolerant parser, and INI headers anywhere
+        data, err = _try_parse_json(text)
+        end = start
+    headers = list(_CONF_SECTION_RE.finditer(text, end))
+    sections = {}
+    for i, m in enumerate(headers):
+        stop = headers[i + 1].start() if i + 1 < len(headers) else len(text)
+        sec = sections[m.group(1).lower()] = {}
+        for kv in _CONF_KV_RE.finditer(text, m.end(), stop):
+            sec[kv.group(1).strip()] = kv.group(2).strip()
+    return {'json': data, 'json_error': err, 'json_end': end, 'sections': sections}
+
+
+def _read_conf_tokens(slicer_type, io=None):
+    """Read BambuStudio.conf FULLY (no byte truncation) → (tokens, path, error).
+    tokens is None when the file is missing or unreadable."""
+    io = io or ScanIO()
+    conf_path = _conf_path(slicer_type)
+    if not io.isfile(conf_path):
         return None, conf_path, 'file not found'
-    text = _try_read_file(conf_path)
+    text = io.read_text(conf_path)
     if text is None:
         return None, conf_path, 'cannot read'
-    data, err = _try_parse_json(text)
-    if data is None:
-        return None, conf_path, f'parse error: {err}'
-    return data, conf_path, None
+    tokens = tokenize_conf(text)
+    if tokens['json'] is None:
+        return tokens, conf_path, f"parse error: {tokens['json_error']}"
+    return tokens, conf_path, None
+
+
+def _read_conf(slicer_type, io=None):
+    """JSON view of the conf → (dict, path, error)."""
+    tokens, conf_path, err = _read_conf_tokens(slicer_type, io)
+    return (tokens['json'] if tokens else None), conf_path, err
 
 
 # ── INI parser ──
@@ -224,8 +410,7 @@ def _filaments_from_colour_key(settings):
         name = re.sub(r'\s*@\s*.+$', '', str(name)).strip()
         ftype = types[i] if i < len(types) else 'PLA'
         vendor = vendors[i] if i < len(vendors) else ''
-        filaments.append({'slot': i+1, 'name': name, 'color': colour,
-                          'type': ftype, 'vendor': vendor})
+        filaments.append(FilamentRecord(i+1, name, colour, ftype, vendor))
     return filaments if filaments else None
 
 
@@ -233,6 +418,7 @@ def _filaments_from_colour_key(settings):
 
 def _extract_all_from_3mf(filepath):
     """Open .3mf ZIP and try ALL known data sources for filament info."""
+    import zipfile
     debug = {'file': filepath, 'sources_tried': []}
     try:
         z = zipfile.ZipFile(filepath, 'r')
@@ -299,56 +485,48 @@ def _src_B_slice_info_xml(z, namelist, debug):
     Expected format:
       <config>
         <plate>
-          <filament id="1" type="PLA" color="#FF0000" used="1"/>
-          <filament id="2" type="PLA" color="#00FF00" used="0"/>
+          <metadata key="index" value="1"/>
+          <filament id="1" type="PLA" color="#FF0000" used_m="0.45" used_g="1.35"/>
+          <filament id="2" type="PLA" color="#00FF00" used_m="0.12" used_g="0.36"/>
         </plate>
       </config>
+    Plates are streamed and merged by slot; /project-filaments?plate=N
+    picks a single plate via project_plate_filaments.
     """
+    import xml.etree.ElementTree as ET
     src = {'name': 'B_slice_info_xml'}
     for cfg in namelist:
         if 'slice_info' not in cfg.lower() or not cfg.lower().endswith('.config'):
             continue
-        raw = z.read(cfg).decode('utf-8', errors='replace')
-        src['size'] = len(raw)
-        if not raw.lstrip().startswith('<'):
+        src['size'] = z.getinfo(cfg).file_size
+        with z.open(cfg) as f:
+            head = f.read(64)
+        if not head.lstrip(b'\xef\xbb\xbf \t\r\n').startswith(b'<'):
             src['status'] = 'not_xml'
             break
+        stats = {}
         try:
-            root = ET.fromstring(raw)
+            with z.open(cfg) as f:
+                plates = list(_iter_slice_info_plates(f, stats=stats))
         except ET.ParseError as e:
             src['status'] = f'xml_error:{e}'
             break
 
-        felems = root.findall('.//filament')
-        src['filament_tags'] = len(felems)
-        if not felems:
-            tags = sorted({elem.tag for elem in root.iter()})
-            src['available_tags'] = tags[:20]
+        src['filament_tags'] = stats['filament_tags']
+        src['plates'] = len(plates)
+        if not stats['filament_tags']:
+            src['available_tags'] = sorted(stats['tags'])[:20]
             src['status'] = 'no_filament_tags'
             break
 
-        filaments = []
-        for elem in felems:
-            fid = elem.get('id', '')
-            color = _normalize_hex(elem.get('color', '') or elem.get('colour', ''))
-            ftype = elem.get('type', 'PLA')
-            used = elem.get('used', '1')
-            name = elem.get('sub_path', '') or elem.get('filament_settings_id', '')
-            name = re.sub(r'\s*@\s*.+$', '', name).strip()
-            if not name:
-                name = f'{ftype} #{fid}'
-            if color:
-                slot = int(fid) if fid.isdigit() else len(filaments) + 1
-                filaments.append({'slot': slot, 'name': name, 'color': color,
-                                  'type': ftype, 'vendor': '', 'used': used})
+        filaments = _merge_plate_filaments(plates)
         if filaments:
             src['status'] = 'ok'
             debug['sources_tried'].append(src)
             return filaments, f'slice_info_xml:{cfg}', debug
         # Has <filament> tags but no color attribute
         src['status'] = 'tags_no_color'
-        if felems:
-            src['sample_attribs'] = dict(felems[0].attrib)
+        src['sample_attribs'] = stats['sample_attribs']
         break
     else:
         src['status'] = 'file_not_found'
@@ -356,6 +534,573 @@ def _src_B_slice_info_xml(z, namelist, debug):
     return None
 
 
+# ── slice_info.config plates ──
+
+def _float_attr(elem, key):
+    try:
+        return float(elem.get(key))
+    except (TypeError, ValueError):
+        return None
+
+
+def _slice_info_filament(elem, slot):
+    """FilamentRecord for one <filament> element, or None without a colour."""
+    fid = elem.get('id', '')
+    color = _normalize_hex(elem.get('color', '') or elem.get('colour', ''))
+    if not color:
+        return None
+    ftype = elem.get('type', 'PLA')
+    name = elem.get('sub_path', '') or elem.get('filament_settings_id', '')
+    name = re.sub(r'\s*@\s*.+$', '', name).strip()
+    if not name:
+        name = f'{ftype} #{fid}'
+    slot = int(fid) if fid.isdigit() else slot
+    return FilamentRecord(slot, name, color, ftype, '', elem.get('used', '1'),
+                          _float_attr(elem, 'used_g'), _float_attr(elem, 'used_m'))
+
+
+def _iter_slice_info_plates(source, plate=None, stats=None):
+    """Stream (plate index, [FilamentRecord, ...]) per <plate> of a
+    slice_info.config (path or binary file object). The index is the plate's
+    <metadata key="index">, else its position. With plate given, only that
+    plate's filaments are built and parsing stops when it closes. Filaments
+    outside any <plate> come last as plate 0."""
+    if isinstance(source, str):
+        with open(source, 'rb') as f:
+            yield from _iter_slice_info_plates(f, plate, stats)
+        return
+    # Decoded with errors='replace' like the other .3mf readers, so one bad
+    # byte does not cost the whole file
+    text = io.TextIOWrapper(source, encoding='utf-8', errors='replace')
+    try:
+        yield from _iter_slice_info_text(text, plate, stats)
+    finally:
+        text.detach()
+
+
+def _iter_slice_info_text(text, plate, stats):
+    import xml.etree.ElementTree as ET
+    if stats is None:
+        stats = {}
+    stats.update(filament_tags=0, tags=set(), sample_attribs=None)
+    ordinal = 0
+    index = None
+    current = []
+    loose = []
+    root = None
+    for event, elem in ET.iterparse(text, events=('start', 'end')):
+        if event == 'start':
+            if root is None:
+                root = elem
+            if elem.tag == 'plate':
+                ordinal += 1
+                index = ordinal
+                current = []
+            continue
+        if len(stats['tags']) < 64:
+            stats['tags'].add(elem.tag)
+        if elem.tag == 'metadata' and index is not None and elem.get('key') == 'index':
+            value = elem.get('value', '')
+            if value.isdigit():
+                index = int(value)
+        elif elem.tag == 'filament':
+            stats['filament_tags'] += 1
+            if stats['sample_attribs'] is None:
+                stats['sample_attribs'] = dict(elem.attrib)
+            target = current if index is not None else loose
+            if plate is None or index == plate:
+                rec = _slice_info_filament(elem, len(target) + 1)
+                if rec:
+                    target.append(rec)
+        elif elem.tag == 'plate':
+            yield index, current
+            if plate is not None and index == plate:
+                return
+            index = None
+            current = []
+            # Finished plates are not kept in the tree
+            root.clear()
+    if loose:
+        yield 0, loose
+
+
+def _merge_plate_filaments(plates):
+    """One record per slot across plates: the first plate's colour and name,
+    usage summed over every plate."""
+    merged = {}
+    for _, filaments in plates:
+        for rec in filaments:
+            first = merged.get(rec.slot)
+            if first is None:
+                merged[rec.slot] = FilamentRecord(*rec.to_row())
+                continue
+            if rec.used not in (None, '0'):
+                first.used = rec.used
+            for f in ('used_g', 'used_m'):
+                v = getattr(rec, f)
+                if v is not None:
+                    total = (getattr(first, f) or 0.0) + v
+                    setattr(first, f, round(total, 4))
+    return [merged[slot] for slot in sorted(merged)]
+
+
+def _conf_backup_path(conf_data):
+    """conf → app.last_backup_path (or a top-level one), with OS separators."""
+    if not isinstance(conf_data, dict):
+        return ''
+    backup = ''
+    app_sec = conf_data.get('app', {})
+    if isinstance(app_sec, dict):
+        backup = app_sec.get('last_backup_path', '')
+    if not backup:
+        backup = conf_data.get('last_backup_path', '')
+    return backup.replace('/', os.sep) if isinstance(backup, str) else ''
+
+
+def _project_source(result, slicer_type='bambu'):
+    """→ (.3mf path, None) or (None, unpacked project dir) behind a scan
+    result, or None when it did not come from a project (e.g. the conf).
+    The backup folder and temp model roots are unpacked 3MFs; the backup
+    folder is re-read from the conf, so results without a debug tree
+    (warm starts, _last_results) resolve too."""
+    source = result.get('source') or ''
+    if source.startswith('3mf:'):
+        return source[4:].split('|', 1)[0], None
+    if source.startswith('temp:'):
+        meta_dir = os.path.dirname(source[5:])
+        if os.path.basename(meta_dir).lower() == 'metadata':
+            return None, os.path.dirname(meta_dir)
+    if source.startswith('backup:'):
+        tokens, _, _ = _read_conf_tokens(slicer_type)
+        backup_path = _conf_backup_path(tokens['json'] if tokens else None)
+        if backup_path:
+            return None, backup_path
+    return None
+
+
+def project_plate_filaments(result, plate, slicer_type='bambu'):
+    """Filaments of one plate of the project behind a scan result, or None
+    when the project has no slice_info.config or no such plate."""
+    import xml.etree.ElementTree as ET
+    import zipfile
+    found = _project_source(result, slicer_type)
+    if not found:
+        return None
+    zip_path, project_dir = found
+    cfg_path = project_dir and os.path.join(project_dir, 'Metadata', 'slice_info.config')
+    try:
+        if zip_path:
+            with zipfile.ZipFile(zip_path) as z:
+                cfg = next((n for n in z.namelist() if 'slice_info' in n.lower()
+                            and n.lower().endswith('.config')), None)
+                if cfg is None:
+                    return None
+                with z.open(cfg) as f:
+                    plates = list(_iter_slice_info_plates(f, plate))
+        else:
+            if not os.path.isfile(cfg_path):
+                return None
+            plates = list(_iter_slice_info_plates(cfg_path, plate))
+    except (ET.ParseError, zipfile.BadZipFile, OSError):
+        return None
+    for index, filaments in plates:
+        if index == plate:
+            return _merge_plate_filaments([(index, filaments)])
+    return None
+
+
+def _select_plate(result, plate, slicer_type='bambu'):
+    """Copy of a scan result narrowed to one plate."""
+    filaments = project_plate_filaments(result, plate, slicer_type)
+    if filaments is None:
+        return dict(result, status='no_plate', plate=plate, count=0, filaments=[])
+    return dict(result, plate=plate, count=len(filaments), filaments=filaments)
+
+
+# ── Paint usage (3D/*.model) ──
+# Multicolour painting is stored per triangle as a TriangleSelector bitstream
+# in hex (paint_color in Bambu/Orca, slic3rpe:mmu_segmentation in older
+# files). The models are read with expat callbacks so no tree is built and
+# memory stays flat regardless of triangle count.
+
+PAINT_ATTRS = ('paint_color', 'slic3rpe:mmu_segmentation')
+PAINT_MAX_STATE = 18    # 2-bit state, or 3 + a 4-bit extension nibble
+_PAINT_CODE_CACHE_MAX = 4096
+
+
+def _paint_states(code):
+    """Distinct leaf states of one triangle's paint code. The hex string is
+    read from the end, one nibble at a time: the low 2 bits give the number
+    of split sides (children = sides + 1), else the high 2 bits are the
+    state, 3 meaning the next nibble holds state - 3. State 0 is unpainted
+    (the object's own extruder), state N is extruder N."""
+    states = set()
+    pos = 0
+    pending = 1
+    n = len(code)
+    while pending and pos < n:
+        pending -= 1
+        nib = int(code[n - 1 - pos], 16)
+        pos += 1
+        split = nib & 0b11
+        if split:
+            pending += split + 1
+            continue
+        state = nib >> 2
+        if state == 3 and pos < n:
+            state = int(code[n - 1 - pos], 16) + 3
+            pos += 1
+        states.add(state)
+    return tuple(sorted(states))
+
+
+def _model_settings_extruders(fileobj):
+    """Extruders assigned to objects/parts in Metadata/model_settings.config."""
+    import xml.parsers.expat
+    extruders = set()
+
+    def start(name, attrs):
+        if name == 'metadata' and attrs.get('key') == 'extruder':
+            value = attrs.get('value', '')
+            if value.isdigit() and int(value) > 0:
+                extruders.add(int(value))
+
+    parser = xml.parsers.expat.ParserCreate()
+    parser.StartElementHandler = start
+    parser.ParseFile(fileobj)
+    return extruders
+
+
+class PaintCounter:
+    """Triangle counts per paint state and per pid/p1 material, fed one
+    model file at a time. Triangles painted with several filaments count
+    once for each of them (and in `mixed`)."""
+
+    def __init__(self):
+        from array import array
+        self.states = array('Q', bytes(8 * (PAINT_MAX_STATE + 1)))
+        self._totals = array('Q', bytes(8 * 3))    # triangles, painted, mixed
+        self.bad_codes = 0
+        self.materials = {}         # basematerials id -> array of counts per index
+        self.material_info = {}     # basematerials id -> [[name, colour], ...]
+        self._codes = {}
+
+    def feed(self, fileobj):
+        import xml.parsers.expat
+        from array import array
+        states = self.states
+        totals = self._totals
+        codes = self._codes
+        materials = self.materials
+        obj = {'pid': None, 'pindex': None}
+        group = []
+        paint_key, legacy_key = PAINT_ATTRS
+
+        def triangle(attrs):
+            totals[0] += 1
+            code = attrs.get(paint_key) or attrs.get(legacy_key)
+            if code:
+                hit = codes.get(code)
+                if hit is None:
+                    try:
+                        hit = _paint_states(code)
+                    except ValueError:
+                        hit = ()
+                        self.bad_codes += 1
+                    if len(codes) < _PAINT_CODE_CACHE_MAX:
+                        codes[code] = hit
+                for st in hit:
+                    if st <= PAINT_MAX_STATE:
+                        states[st] += 1
+                if len(hit) > 1:
+                    totals[2] += 1
+                if any(hit):
+                    totals[1] += 1
+            else:
+                states[0] += 1
+            if materials:
+                pid = attrs.get('pid', obj['pid'])
+                p1 = attrs.get('p1', obj['pindex'])
+                counts = materials.get(pid)
+                if counts is not None and p1 is not None and p1.isdigit():
+                    i = int(p1)
+                    if i >= len(counts):
+                        counts.extend([0] * (i + 1 - len(counts)))
+                    counts[i] += 1
+
+        def start(name, attrs):
+            # Hot path: <triangle> in the default namespace
+            if name == 'triangle':
+                triangle(attrs)
+                return
+            tag = name.rpartition(':')[2]
+            if tag == 'triangle':
+                triangle(attrs)
+            elif tag == 'object':
+                obj['pid'] = attrs.get('pid')
+                obj['pindex'] = attrs.get('pindex')
+            elif tag == 'basematerials':
+                gid = attrs.get('id', '')
+                materials.setdefault(gid, array('Q'))
+                group[:] = [self.material_info.setdefault(gid, [])]
+            elif tag == 'base' and group:
+                group[0].append([attrs.get('name', ''),
+                                 _normalize_hex(attrs.get('displaycolor', ''))])
+
+        parser = xml.parsers.expat.ParserCreate()
+        parser.StartElementHandler = start
+        parser.ParseFile(fileobj)
+
+    def report(self, default_extruders=()):
+        slots = [{'slot': st, 'triangles': self.states[st]}
+                 for st in range(1, PAINT_MAX_STATE + 1) if self.states[st]]
+        used = {d['slot'] for d in slots}
+        if self.states[0]:
+            # Unpainted triangles print with their object's extruder
+            used.update(default_extruders or (1,))
+        materials = []
+        for gid, counts in self.materials.items():
+            info = self.material_info.get(gid, [])
+            for i, n in enumerate(counts):
+                if n:
+                    name, colour = info[i] if i < len(info) else ('', '')
+                    materials.append({'pid': gid, 'index': i, 'name': name,
+                                      'color': colour, 'triangles': n})
+        triangles, painted, mixed = self._totals
+        return {'triangles': triangles, 'painted': painted,
+                'mixed': mixed, 'unpainted': self.states[0],
+                'default_extruders': sorted(default_extruders),
+                'slots': slots, 'slots_used': sorted(used),
+                'materials': materials, 'bad_codes': self.bad_codes}
+
+
+def analyze_paint_usage(zip_path=None, project_dir=None):
+    """Stream every 3D/*.model of a .3mf (or an unpacked project) through a
+    PaintCounter → usage report, or None when there is no model."""
+    import zipfile
+    counter = PaintCounter()
+    extruders = set()
+    files = 0
+    if zip_path:
+        with zipfile.ZipFile(zip_path) as z:
+            for name in z.namelist():
+                low = name.lower()
+                if low.startswith('3d/') and low.endswith('.model'):
+                    with z.open(name) as f:
+                        counter.feed(f)
+                    files += 1
+                elif low == 'metadata/model_settings.config':
+                    with z.open(name) as f:
+                        extruders = _model_settings_extruders(f)
+    else:
+        for rd, _, fns in os.walk(os.path.join(project_dir, '3D')):
+            for fn in fns:
+                if fn.lower().endswith('.model'):
+                    with open(os.path.join(rd, fn), 'rb') as f:
+                        counter.feed(f)
+                    files += 1
+        settings = os.path.join(project_dir, 'Metadata', 'model_settings.config')
+        if os.path.isfile(settings):
+            with open(settings, 'rb') as f:
+                extruders = _model_settings_extruders(f)
+    if not files:
+        return None
+    return dict(counter.report(extruders), files=files)
+
+
+# Reports by project path, revalidated by the model file's stat signature
+PAINT_USAGE_CACHE_MAX = 8
+_paint_usage_cache = {}
+
+
+def project_paint_usage(result, slicer_type='bambu'):
+    """Paint usage of the project behind a scan result, or None."""
+    import xml.parsers.expat
+    import zipfile
+    found = _project_source(result, slicer_type)
+    if not found:
+        return None
+    zip_path, project_dir = found
+    key = zip_path or project_dir
+    sig = _stat_sig(zip_path or os.path.join(project_dir, '3D', '3dmodel.model'))
+    if sig is None:
+        return None
+    with _state_lock:
+        cached = _paint_usage_cache.get(key)
+    if cached and cached[0] == sig:
+        return cached[1]
+    t0 = time.monotonic()
+    try:
+        usage = analyze_paint_usage(zip_path, project_dir)
+    except (xml.parsers.expat.ExpatError, zipfile.BadZipFile, OSError) as e:
+        return {'error': str(e)}
+    if usage is not None:
+        usage['elapsed_ms'] = round((time.monotonic() - t0) * 1000, 1)
+    with _state_lock:
+        if len(_paint_usage_cache) >= PAINT_USAGE_CACHE_MAX:
+            _paint_usage_cache.pop(next(iter(_paint_usage_cache)))
+        _paint_usage_cache[key] = (sig, usage)
+    return usage
+
+
+# ── Project thumbnails (Metadata/plate_N.png) ──
+
+THUMBNAIL_CACHE_BYTES = 8 * 1024 * 1024
+THUMBNAIL_MIN_SIZE = 16
+THUMBNAIL_MAX_SIZE = 1024
+
+
+class ByteLRU:
+    """LRU mapping bounded by the total byte size of its values. Relies on
+    dict insertion order: a hit is moved to the end, eviction pops the front."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._lock = threading.Lock()
+        self._items = {}
+        self.stats = {'hits': 0, 'misses': 0, 'evicted': 0}
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.pop(key, None)
+            if item is None:
+                self.stats['misses'] += 1
+                return None
+            self._items[key] = item
+            self.stats['hits'] += 1
+            return item[0]
+
+    def put(self, key, value, nbytes):
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.bytes -= old[1]
+            self._items[key] = (value, nbytes)
+            self.bytes += nbytes
+            while self.bytes > self.max_bytes:
+                oldest = next(iter(self._items))
+                self.bytes -= self._items.pop(oldest)[1]
+                self.stats['evicted'] += 1
+
+
+_thumbnail_cache = ByteLRU(THUMBNAIL_CACHE_BYTES)
+
+
+_THUMBNAIL_RE = re.compile(r'metadata/plate_(\d+)\.png')
+# Nominal byte cost of a cached plate listing, so listings count towards
+# the LRU's cap like images do
+THUMBNAIL_LISTING_BYTES = 64
+
+
+def _list_thumbnails(zip_path, project_dir):
+    """{plate: zip member or file path} of the thumbnails a project carries.
+    Older and Prusa-style projects only have Metadata/thumbnail.png, which
+    stands in for plate 1."""
+    import zipfile
+    if zip_path:
+        with zipfile.ZipFile(zip_path) as z:
+            names = z.namelist()
+    else:
+        meta_dir = os.path.join(project_dir, 'Metadata')
+        try:
+            names = ['Metadata/' + fn for fn in os.listdir(meta_dir)]
+        except OSError:
+            names = []
+    plates = {}
+    fallback = None
+    for name in names:
+        low = name.lower()
+        m = _THUMBNAIL_RE.fullmatch(low)
+        if m:
+            plates[int(m.group(1))] = name
+        elif low == 'metadata/thumbnail.png':
+            fallback = name
+    if fallback and 1 not in plates:
+        plates[1] = fallback
+    if not zip_path:
+        plates = {n: os.path.join(project_dir, *name.split('/')) for n, name in plates.items()}
+    return plates
+
+
+def _read_thumbnail(zip_path, member):
+    """Raw PNG bytes of one thumbnail listed by _list_thumbnails."""
+    import zipfile
+    if zip_path:
+        with zipfile.ZipFile(zip_path) as z:
+            return z.read(member)
+    with open(member, 'rb') as f:
+        return f.read()
+
+
+def _downscale_png(data, size):
+    """Fit a PNG within size×size; unchanged if smaller or Pillow is missing."""
+    try:
+        from PIL import Image
+    except ImportError:
+        return data
+    with Image.open(io.BytesIO(data)) as img:
+        if max(img.size) <= size:
+            return data
+        img.thumbnail((size, size), Image.LANCZOS)
+        out = io.BytesIO()
+        img.save(out, format='PNG')
+        return out.getvalue()
+
+
+def _thumbnail_sig(zip_path, project_dir):
+    path = zip_path or os.path.join(project_dir, 'Metadata')
+    sig = _stat_sig(path)
+    return (path, sig[0], sig[1]) if sig else None
+
+
+def project_thumbnail_plates(zip_path=None, project_dir=None):
+    """{plate: member} of a project's thumbnails, cached by (path, mtime, size)."""
+    import zipfile
+    sig = _thumbnail_sig(zip_path, project_dir)
+    if sig is None:
+        return {}
+    key = ('plates',) + sig
+    plates = _thumbnail_cache.get(key)
+    if plates is None:
+        try:
+            plates = _list_thumbnails(zip_path, project_dir)
+        except (zipfile.BadZipFile, OSError):
+            plates = {}
+        _thumbnail_cache.put(key, plates, THUMBNAIL_LISTING_BYTES * (1 + len(plates)))
+    return plates
+
+
+def project_thumbnail(zip_path=None, project_dir=None, plate=1, size=None):
+    """→ (png bytes, etag) for a plate thumbnail, or None when the project has
+    no such plate. Cached by (path, mtime, size, plate, size) so repeat views
+    only cost a stat; plates that do not exist are answered from the cached
+    listing and never add entries."""
+    import zipfile
+    sig = _thumbnail_sig(zip_path, project_dir)
+    member = project_thumbnail_plates(zip_path, project_dir).get(plate)
+    if sig is None or member is None:
+        return None
+    key = sig + (plate, size)
+    hit = _thumbnail_cache.get(key)
+    if hit is not None:
+        return hit
+    try:
+        data = _read_thumbnail(zip_path, member)
+    except (zipfile.BadZipFile, KeyError, OSError):
+        return None
+    if size:
+        try:
+            data = _downscale_png(data, size)
+        except (OSError, ValueError):
+            pass
+    value = (data, '"' + hashlib.sha1(data).hexdigest()[:32] + '"')
+    _thumbnail_cache.put(key, value, len(data))
+    return value
+
+
 def _src_C_config_filament_json(z, namelist, debug):
     """Source C: Config/filament/*.json — embedded filament preset JSONs."""
     src = {'name': 'C_config_filament_json'}
@@ -401,8 +1146,7 @@ def _src_C_config_filament_json(z, namelist, debug):
                 vendor = vendor[0] if vendor else ''
             src['parsed'].append({'file': os.path.basename(fj), 'color': colour, 'name': name})
             if colour:
-                filaments.append({'slot': idx+1, 'name': name, 'color': colour,
-                                  'type': ftype, 'vendor': vendor})
+                filaments.append(FilamentRecord(idx+1, name, colour, ftype, vendor))
         except Exception as e:
             src['parsed'].append({'file': os.path.basename(fj), 'error': str(e)})
 
@@ -417,6 +1161,7 @@ def _src_C_config_filament_json(z, namelist, debug):
 
 def _src_D_3dmodel_xml(z, namelist, debug):
     """Source D: 3D/3dmodel.model — standard 3MF <basematerials>."""
+    import xml.etree.ElementTree as ET
     src = {'name': 'D_3dmodel_xml'}
     mfiles = [f for f in namelist if f.lower() == '3d/3dmodel.model']
     if not mfiles:
@@ -442,8 +1187,7 @@ def _src_D_3dmodel_xml(z, namelist, debug):
             color = _normalize_hex(base.get('displaycolor', ''))
             name = base.get('name', f'Material {i+1}')
             if color:
-                filaments.append({'slot': i+1, 'name': name, 'color': color,
-                                  'type': 'PLA', 'vendor': ''})
+                filaments.append(FilamentRecord(i+1, name, color))
     if filaments:
         src['status'] = 'ok'
         debug['sources_tried'].append(src)
@@ -455,13 +1199,54 @@ def _src_D_3dmodel_xml(z, namelist, debug):
 
 # ── .3mf file collection ──
 
-def _collect_3mf_files(slicer_type, conf_data=None):
-    """Gather .3mf files, newest first, deduped."""
-    found = []
-    seen = set()
+def _3mf_scan_dirs(slicer_type):
+    """Directories whose top level is scanned for .3mf candidates."""
     appdata = os.environ.get('APPDATA', '')
     userprofile = os.environ.get('USERPROFILE', '')
     app = 'BambuStudio' if slicer_type != 'orca' else 'OrcaSlicer'
+    dirs = [os.path.join(appdata, app, sub) if sub else os.path.join(appdata, app)
+            for sub in ('', 'cache', 'projects')]
+    dirs += [os.path.join(userprofile, name)
+             for name in ('Desktop', 'Documents', 'Downloads', '3D Objects')]
+    return dirs
+
+
+def _collect_3mf_files(slicer_type, conf_data=None, memo=None, io=None):
+    """Gather .3mf files, newest first, deduped.
+    The candidate list is cached and reused while the conf and the scanned
+    directories keep their mtimes; only the candidates themselves are re-stat'ed."""
+    io = io or ScanIO()
+    inputs = _stat_sigs([_conf_path(slicer_type)] + _3mf_scan_dirs(slicer_type), io)
+    with _state_lock:
+        entry = _candidate_index.get(slicer_type)
+    if entry and entry['inputs'] == inputs:
+        found = []
+        for path in entry['paths']:
+            try:
+                found.append((io.getmtime(path), path))
+            except OSError:
+                pass
+        found.sort(reverse=True)
+        return found
+    found = _scan_3mf_files(slicer_type, conf_data, memo, io)
+    with _state_lock:
+        _candidate_index[slicer_type] = {'inputs': inputs, 'paths': [p for _, p in found]}
+    _mark_state_dirty()
+    return found
+
+
+def _list_dir_files(d):
+    """Top-level file paths of a directory ([] if unreadable)."""
+    try:
+        return [e.path for e in os.scandir(d) if e.is_file()]
+    except (PermissionError, OSError):
+        return []
+
+
+def _scan_3mf_files(slicer_type, conf_data=None, memo=None, io=None):
+    io = io or ScanIO()
+    found = []
+    seen = set()
 
     def add(path):
         if not path or not isinstance(path, str):
@@ -473,9 +1258,9 @@ def _collect_3mf_files(slicer_type, conf_data=None):
         if np in seen:
             return
         seen.add(np)
-        if os.path.isfile(path):
+        if io.isfile(path):
             try:
-                found.append((os.path.getmtime(path), path))
+                found.append((io.getmtime(path), path))
             except OSError:
                 pass
 
@@ -493,62 +1278,303 @@ def _collect_3mf_files(slicer_type, conf_data=None):
                 val = rp[key]
                 if isinstance(val, str):
                     add(val)
-    for sub in ('', 'cache', 'projects'):
-        d = os.path.join(appdata, app, sub) if sub else os.path.join(appdata, app)
-        if os.path.isdir(d):
-            try:
-                for e in os.scandir(d):
-                    if e.is_file(): add(e.path)
-            except (PermissionError, OSError):
-                pass
-    for name in ('Desktop', 'Documents', 'Downloads', '3D Objects'):
-        d = os.path.join(userprofile, name)
-        if os.path.isdir(d):
-            try:
-                for e in os.scandir(d):
-                    if e.is_file(): add(e.path)
-            except (PermissionError, OSError):
-                pass
+    for d in _3mf_scan_dirs(slicer_type):
+        if io.isdir(d):
+            for path in _memoized(memo, ('listdir', d), _list_dir_files, d):
+                add(path)
     found.sort(reverse=True)
     return found
 
 
 # ── Main entry points ──
 
-def _build_filament_color_map(user_dir, app, appdata):
-    """Build {preset_name: '#RRGGBB'} map from user + system filament presets."""
-    color_map = {}
-
-    # 1) User presets: %APPDATA%\BambuStudio\user\[UID]\filament\*.json
-    if os.path.isdir(user_dir):
-        for uid in os.listdir(user_dir):
-            fil_dir = os.path.join(user_dir, uid, 'filament')
-            if os.path.isdir(fil_dir):
-                _scan_filament_dir(fil_dir, color_map)
-
-    # 2) System presets: %APPDATA%\BambuStudio\system\*\filament\
-    sys_dir = os.path.join(appdata, app, 'system')
-    if os.path.isdir(sys_dir):
-        for vendor in os.listdir(sys_dir):
-            fil_dir = os.path.join(sys_dir, vendor, 'filament')
-            if os.path.isdir(fil_dir):
-                _scan_filament_dir(fil_dir, color_map)
-
-    # 3) Program files resources
+def _filament_preset_dirs(user_dir, app, appdata):
+    """→ (root dirs, filament preset dirs) in precedence order: user, system, Program Files."""
+    roots = [user_dir, os.path.join(appdata, app, 'system')]
     for pf in [os.environ.get('ProgramFiles', ''), os.environ.get('ProgramFiles(x86)', '')]:
-        if not pf:
-            continue
-        prog_dir = os.path.join(pf, 'Bambu Studio', 'resources', 'profiles')
-        if os.path.isdir(prog_dir):
-            for vendor in os.listdir(prog_dir):
-                fil_dir = os.path.join(prog_dir, vendor, 'filament')
-                if os.path.isdir(fil_dir):
-                    _scan_filament_dir(fil_dir, color_map)
+        if pf:
+            roots.append(os.path.join(pf, 'Bambu Studio', 'resources', 'profiles'))
+    fil_dirs = []
+    for root in roots:
+        # user\[UID]\filament, system\[vendor]\filament, profiles\[vendor]\filament
+        if os.path.isdir(root):
+            try:
+                for sub in os.listdir(root):
+                    fil_dir = os.path.join(root, sub, 'filament')
+                    if os.path.isdir(fil_dir):
+                        fil_dirs.append(fil_dir)
+            except (PermissionError, OSError):
+                pass
+    return roots, fil_dirs
+
 
+def _build_filament_color_map(user_dir, app, appdata, entries=None):
+    """Build {preset_name: '#RRGGBB'} map from user + system filament presets.
+    entries, if given, also collects one preset row per preset."""
+    color_map = {}
+    for fil_dir in _filament_preset_dirs(user_dir, app, appdata)[1]:
+        _scan_filament_dir(fil_dir, color_map, entries)
     return color_map
 
 
-def _scan_filament_dir(fil_dir, color_map):
+# Per-directory scan results {fil_dir: (sig, map, rows)}, kept in memory only
+# so a change in one vendor's folder rescans just that folder
+_preset_dir_cache = {}
+
+
+def _preset_dir_sig(fil_dir):
+    """Directory [mtime_ns, size] plus the preset files' count, newest mtime
+    and total size (one subdirectory level, like _scan_filament_dir).
+    Saving a preset in place leaves the directory mtime alone, so the files
+    themselves have to be part of the signature."""
+    sig = _stat_sig(fil_dir)
+    if sig is None:
+        return None
+    totals = [0, 0, 0]     # count, newest mtime_ns, total size
+
+    def walk(d, depth):
+        try:
+            for entry in os.scandir(d):
+                if entry.is_dir():
+                    if depth == 0:
+                        walk(entry.path, 1)
+                    continue
+                if entry.name.lower().endswith(('.json', '.info')):
+                    st = entry.stat()
+                    totals[0] += 1
+                    totals[1] = max(totals[1], st.st_mtime_ns)
+                    totals[2] += st.st_size
+        except (PermissionError, OSError):
+            pass
+
+    walk(fil_dir, 0)
+    return sig + totals
+
+
+def _scan_filament_dir_cached(fil_dir, sig):
+    """→ (map, rows) of one preset directory, rescanned only when its sig changes."""
+    with _state_lock:
+        cached = _preset_dir_cache.get(fil_dir)
+    if cached and cached[0] == sig:
+        return cached[1], cached[2]
+    color_map, rows = {}, []
+    _scan_filament_dir(fil_dir, color_map, rows)
+    with _state_lock:
+        _preset_dir_cache[fil_dir] = (sig, color_map, rows)
+    return color_map, rows
+
+
+def _preset_cache_entry(slicer_type):
+    """{'inputs', 'map', 'entries'} for a slicer's presets, revalidated by
+    the preset roots' mtimes and each filament directory's content
+    signature, and rebuilt when stale. Each entry row is
+    [name, colour, type, vendor, inherits, instantiation] with only the
+    preset's own values."""
+    app = 'BambuStudio' if slicer_type != 'orca' else 'OrcaSlicer'
+    appdata = os.environ.get('APPDATA', '')
+    user_dir = os.path.join(appdata, app, 'user')
+    roots, fil_dirs = _filament_preset_dirs(user_dir, app, appdata)
+    inputs = _stat_sigs(roots)
+    inputs.update((d, _preset_dir_sig(d)) for d in fil_dirs)
+    with _state_lock:
+        entry = _preset_color_cache.get(app)
+    if entry and entry['inputs'] == inputs and 'entries' in entry:
+        return entry
+    # Same merge as _build_filament_color_map, reusing unchanged directories
+    entries = []
+    color_map = {}
+    for fil_dir in fil_dirs:
+        dir_map, dir_rows = _scan_filament_dir_cached(fil_dir, inputs[fil_dir])
+        color_map.update(dir_map)
+        entries.extend(dir_rows)
+    entry = {'inputs': inputs, 'map': color_map, 'entries': entries}
+    with _state_lock:
+        _preset_color_cache[app] = entry
+    _mark_state_dirty()
+    return entry
+
+
+def preset_color_map(slicer_type='bambu'):
+    """Cached _build_filament_color_map, revalidated by preset file signatures."""
+    return _preset_cache_entry(slicer_type)['map']
+
+
+def preset_entries(slicer_type='bambu'):
+    """Cached [name, colour, type, vendor, inherits, instantiation] rows of every preset."""
+    return _preset_cache_entry(slicer_type)['entries']
+
+
+# ── Preset metadata index ──
+
+def _preset_key(name):
+    return ' '.join(str(name).lower().split())
+
+
+class PresetIndex:
+    """Preset metadata keyed by normalised name, also reachable by the name
+    without its @printer suffix. inherits chains are resolved on first
+    lookup and memoised, so later lookups are a pair of dict hits."""
+
+    FIELDS = ('color', 'type', 'vendor')
+
+    def __init__(self, entries):
+        self._raw = {}
+        for row in entries:
+            self._raw.setdefault(_preset_key(row[0]), row)
+        for key, row in list(self._raw.items()):
+            base = _preset_key(re.sub(r'\s*@\s*.+$', '', row[0]))
+            if base:
+                self._raw.setdefault(base, row)
+        self._resolved = {}
+
+    def __len__(self):
+        return len(self._raw)
+
+    def lookup(self, name):
+        """→ {'name', 'color', 'type', 'vendor', 'inherits'} or None."""
+        key = _preset_key(name)
+        if key in self._resolved:
+            return self._resolved[key]
+        row = self._raw.get(key)
+        if row is None:
+            return None
+        meta = {'name': row[0], 'color': row[1], 'type': row[2],
+                'vendor': row[3], 'inherits': row[4]}
+        # Fill missing fields from the parent chain (cycle-safe)
+        seen = {key}
+        parent = row[4]
+        while parent and not all(meta[f] for f in self.FIELDS):
+            pkey = _preset_key(parent)
+            if pkey in seen:
+                break
+            seen.add(pkey)
+            resolved = self._resolved.get(pkey)
+            if resolved is not None:
+                for f in self.FIELDS:
+                    meta[f] = meta[f] or resolved[f]
+                break
+            prow = self._raw.get(pkey)
+            if prow is None:
+                break
+            for f, v in zip(self.FIELDS, prow[1:4]):
+                meta[f] = meta[f] or v
+            parent = prow[4]
+        self._resolved[key] = meta
+        return meta
+
+    def resolved_rows(self, selectable=False):
+        """[name, colour, type, vendor] per distinct preset, inheritance applied.
+        selectable drops abstract bases (instantiation: false)."""
+        rows = []
+        seen = set()
+        for row in self._raw.values():
+            if id(row) in seen:
+                continue
+            seen.add(id(row))
+            if selectable and str(row[5]).lower() == 'false':
+                continue
+            meta = self.lookup(row[0])
+            rows.append([meta['name'], meta['color'], meta['type'], meta['vendor']])
+        return rows
+
+
+_preset_indexes = {}
+
+
+def preset_index(slicer_type='bambu'):
+    """PresetIndex over the cached preset entries; rebuilt when they change."""
+    entries = preset_entries(slicer_type)
+    with _state_lock:
+        cached = _preset_indexes.get(slicer_type)
+        if cached and cached[0] is entries:
+            return cached[1]
+    index = PresetIndex(entries)
+    with _state_lock:
+        _preset_indexes[slicer_type] = (entries, index)
+    return index
+
+
+# ── Filament preset catalog ──
+
+FILAMENT_PRESETS_LIMIT = 50
+FILAMENT_PRESETS_MAX_LIMIT = 500
+
+
+class PresetCatalog:
+    """Selectable presets sorted by normalised name. Prefix queries bisect
+    the sorted keys; substring queries run str.find over the keys joined
+    into one string and bisect the hit back to its row."""
+
+    def __init__(self, rows):
+        rows = sorted(rows, key=lambda r: _preset_key(r[0]))
+        self.rows = rows
+        self.keys = [_preset_key(r[0]) for r in rows]
+        self._types = [r[2].lower() for r in rows]
+        self._vendors = [r[3].lower() for r in rows]
+        self._blob = '\n'.join(self.keys)
+        self._starts = []
+        pos = 0
+        for key in self.keys:
+            self._starts.append(pos)
+            pos += len(key) + 1
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _prefix(self, q):
+        i = bisect.bisect_left(self.keys, q)
+        while i < len(self.keys) and self.keys[i].startswith(q):
+            yield i
+            i += 1
+
+    def _substring(self, q):
+        pos = self._blob.find(q)
+        while pos != -1:
+            i = bisect.bisect_right(self._starts, pos) - 1
+            yield i
+            # Next search starts at the following key
+            if i + 1 >= len(self._starts):
+                break
+            pos = self._blob.find(q, self._starts[i + 1])
+
+    def search(self, q='', match='prefix', vendor='', ftype='', limit=FILAMENT_PRESETS_LIMIT, offset=0):
+        """→ (total, [row, ...]) for one page of matches in name order."""
+        q = _preset_key(q)
+        if not q:
+            hits = range(len(self.rows))
+        elif match == 'substring':
+            hits = self._substring(q)
+        else:
+            hits = self._prefix(q)
+        vendor, ftype = vendor.lower(), ftype.lower()
+        total = 0
+        page = []
+        for i in hits:
+            if (vendor and self._vendors[i] != vendor) or (ftype and self._types[i] != ftype):
+                continue
+            if offset <= total < offset + limit:
+                page.append(self.rows[i])
+            total += 1
+        return total, page
+
+
+_preset_catalogs = {}
+
+
+def preset_catalog(slicer_type='bambu'):
+    """PresetCatalog over the selectable presets; rebuilt when the preset index changes."""
+    presets = preset_index(slicer_type)
+    with _state_lock:
+        cached = _preset_catalogs.get(slicer_type)
+        if cached and cached[0] is presets:
+            return cached[1]
+    catalog = PresetCatalog(presets.resolved_rows(selectable=True))
+    with _state_lock:
+        _preset_catalogs[slicer_type] = (presets, catalog)
+    return catalog
+
+
+def _scan_filament_dir(fil_dir, color_map, entries=None):
     """Scan a directory of .json filament presets and add to color_map."""
     try:
         for entry in os.scandir(fil_dir):
@@ -558,20 +1584,27 @@ def _scan_filament_dir(fil_dir, color_map):
                     try:
                         for sub_entry in os.scandir(entry.path):
                             if sub_entry.is_file() and sub_entry.name.lower().endswith('.json'):
-                                _read_filament_preset(sub_entry.path, color_map)
+                                _read_filament_preset(sub_entry.path, color_map, entries)
                     except (PermissionError, OSError):
                         pass
                 continue
             if entry.name.lower().endswith('.json'):
-                _read_filament_preset(entry.path, color_map)
+                _read_filament_preset(entry.path, color_map, entries)
             elif entry.name.lower().endswith('.info'):
                 # BambuStudio .info format (INI-style)
-                _read_filament_info(entry.path, color_map)
+                _read_filament_info(entry.path, color_map, entries)
     except (PermissionError, OSError):
         pass
 
 
-def _read_filament_preset(filepath, color_map):
+def _first_value(data, key, default=''):
+    val = data.get(key, default)
+    if isinstance(val, list):
+        val = val[0] if val else default
+    return str(val).strip() if val is not None else default
+
+
+def _read_filament_preset(filepath, color_map, entries=None):
     """Read a single filament .json preset and add name→color to map."""
     try:
         text = _try_read_file(filepath)
@@ -592,6 +1625,7 @@ def _read_filament_preset(filepath, color_map):
         if not name:
             name = os.path.splitext(os.path.basename(filepath))[0]
         # Get color
+        colour = ''
         for ck in ('filament_colour', 'default_filament_colour', 'filament_color', 'color'):
             val = data.get(ck)
             if isinstance(val, list):
@@ -607,11 +1641,18 @@ def _read_filament_preset(filepath, color_map):
                 color_map[name.lower()] = colour
                 color_map[base.lower()] = colour
                 break
+        # Colourless presets are kept too: bases such as fdm_filament_pla
+        # carry the type that their children inherit
+        if entries is not None:
+            entries.append([name, colour, _first_value(data, 'filament_type'),
+                            _first_value(data, 'filament_vendor'),
+                            _first_value(data, 'inherits'),
+                            _first_value(data, 'instantiation')])
     except Exception:
         pass
 
 
-def _read_filament_info(filepath, color_map):
+def _read_filament_info(filepath, color_map, entries=None):
     """Read .info file (INI format) for filament name→color."""
     try:
         text = _try_read_file(filepath)
@@ -624,211 +1665,273 @@ def _read_filament_info(filepath, color_map):
             if colour:
                 color_map[name] = colour
                 color_map[name.lower()] = colour
+                if entries is not None:
+                    entries.append([name, colour, settings.get('filament_type', ''),
+                                    settings.get('filament_vendor', ''),
+                                    settings.get('inherits', ''), ''])
                 break
     except Exception:
         pass
 
 
-def get_project_filaments(slicer_type='bambu'):
-    """Main: find and extract project filaments."""
-    debug = {'strategies': []}
-    app = 'BambuStudio' if slicer_type != 'orca' else 'OrcaSlicer'
-    appdata = os.environ.get('APPDATA', '')
+# ── Shared scan memo (slicer=all) ──
+
+class ScanMemo:
+    """Per-request memo shared by the bambu and orca pipelines of one
+    slicer=all scan. The first caller of a key computes it; concurrent
+    callers wait for that result instead of repeating the work."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self.stats = {'computed': 0, 'shared': 0}
+        self.io = ScanIO()
+
+    def get(self, key, fn, *args):
+        with self._lock:
+            entry = self._entries.get(key)
+            owner = entry is None
+            if owner:
+                entry = self._entries[key] = {'done': threading.Event(), 'value': None}
+                self.stats['computed'] += 1
+            else:
+                self.stats['shared'] += 1
+        if owner:
+            try:
+                entry['value'] = fn(*args)
+            finally:
+                entry['done'].set()
+        else:
+            entry['done'].wait()
+        return entry['value']
+
+
+def _memoized(memo, key, fn, *args):
+    return fn(*args) if memo is None else memo.get(key, fn, *args)
+
+
+def _parse_config_file(path, io):
+    text = io.read_text(path)
+    return _try_parse_any_format(text) if text else None
+
+
+def _model_root_configs(model_root, io, ctx=None, entry=None):
+    """*.config files under a temp model root, newest first.
+    None if the walk was cancelled (never the case for shared walks)."""
+    configs = []
+    for rd, dirs, files in os.walk(model_root):
+        if ctx is not None and _cancelled(ctx, entry):
+            return None
+        for fn in files:
+            if fn.lower().endswith('.config'):
+                fp = os.path.join(rd, fn)
+                try: configs.append((io.getmtime(fp), fp))
+                except OSError: pass
+    configs.sort(reverse=True)
+    return configs
+
+
+# ── Discovery strategies ──
+# Each strategy takes the shared ctx and its own debug entry, and returns
+# (filaments, source) on success or None. Lower-numbered strategies win.
+# ctx['memo'] (a ScanMemo or None) dedupes work across slicer=all pipelines;
+# ctx['io'] (a ScanIO) memoises file reads and stats within the request.
+
+def _cancelled(ctx, entry):
+    """True (and mark the debug entry) once a higher-priority result is confirmed."""
+    if ctx['cancel'].is_set():
+        entry['status'] = 'cancelled'
+        return True
+    return False
+
+
+def _numbered_preset_names(entry):
+    """Names from filament, filament_01, filament_02, ... keys."""
+    names = []
+    base = entry.get('filament', '')
+    if base:
+        names.append(base)
+    for idx in range(1, 32):
+        val = entry.get(f'filament_{idx:02d}', '')
+        if not val:
+            break
+        names.append(val)
+    return names
 
-    conf_data, conf_path, conf_err = _read_conf(slicer_type)
-    debug['conf'] = {'path': conf_path, 'ok': conf_data is not None, 'error': conf_err}
 
-    # ── Strategy 0: conf JSON → filament colors ──
-    # BambuStudio: presets.filament_colors = "#DCD,#FFF,..." (comma-separated string)
-    # OrcaSlicer:  orca_presets = [{machine:"X", filament_colors:"#A,#B"}, ...] (array per printer)
-    s0 = {'name': '0_conf_json_presets'}
-    if conf_data and isinstance(conf_data, dict):
-        found_colors = ''
-        found_names = []
-        found_in = ''
-
-        # ── Path A: BambuStudio-style presets.filament_colors (string) ──
-        presets = conf_data.get('presets', {})
-        if isinstance(presets, dict):
-            s0['presets_keys'] = list(presets.keys())[:20]
-            for ck in ('filament_colors', 'filament_colours', 'filament_multi_colors'):
-                val = presets.get(ck, '')
-                if val and isinstance(val, str) and '#' in val:
-                    found_colors = val
-                    found_in = f'presets.{ck}'
+def _strategy_conf_presets(ctx, s0):
+    """Strategy 0: conf JSON → filament colors.
+    BambuStudio: presets.filament_colors = "#DCD,#FFF,..." (comma-separated string)
+    OrcaSlicer:  orca_presets = [{machine:"X", filament_colors:"#A,#B"}, ...] (array per printer)
+    """
+    conf_data = ctx['conf_data']
+    if not (conf_data and isinstance(conf_data, dict)):
+        s0['status'] = 'conf_unavailable'
+        return None
+    found_colors = ''
+    found_names = []
+    found_in = ''
+
+    # ── Path A: BambuStudio-style presets.filament_colors (string) ──
+    presets = conf_data.get('presets', {})
+    if isinstance(presets, dict):
+        s0['presets_keys'] = list(presets.keys())[:20]
+        for ck in ('filament_colors', 'filament_colours', 'filament_multi_colors'):
+            val = presets.get(ck, '')
+            if val and isinstance(val, str) and '#' in val:
+                found_colors = val
+                found_in = f'presets.{ck}'
+                break
+        if found_colors:
+            fil = presets.get('filaments', [])
+            if isinstance(fil, list) and fil and fil[0] is not None:
+                found_names = fil
+
+    # ── Path B: OrcaSlicer-style orca_presets array ──
+    if not found_colors:
+        orca_presets = conf_data.get('orca_presets', [])
+        if isinstance(orca_presets, list) and orca_presets:
+            s0['orca_presets_count'] = len(orca_presets)
+            # Get currently selected machine
+            current_machine = ''
+            if isinstance(presets, dict):
+                current_machine = presets.get('machine', '')
+            s0['current_machine'] = current_machine
+
+            # Find matching entry (try exact match, then partial)
+            matched_entry = None
+            for entry in orca_presets:
+                if not isinstance(entry, dict):
+                    continue
+                em = entry.get('machine', '')
+                if em == current_machine:
+                    matched_entry = entry
                     break
-            if found_colors:
-                fil = presets.get('filaments', [])
-                if isinstance(fil, list) and fil and fil[0] is not None:
-                    found_names = fil
-
-        # ── Path B: OrcaSlicer-style orca_presets array ──
-        if not found_colors:
-            orca_presets = conf_data.get('orca_presets', [])
-            if isinstance(orca_presets, list) and orca_presets:
-                s0['orca_presets_count'] = len(orca_presets)
-                # Get currently selected machine
-                current_machine = ''
-                if isinstance(presets, dict):
-                    current_machine = presets.get('machine', '')
-                s0['current_machine'] = current_machine
-
-                # Find matching entry (try exact match, then partial)
-                matched_entry = None
+            # Partial match (machine name without suffix)
+            if not matched_entry and current_machine:
+                cm_base = current_machine.split('_')[0].strip()
                 for entry in orca_presets:
                     if not isinstance(entry, dict):
                         continue
                     em = entry.get('machine', '')
-                    if em == current_machine:
+                    if cm_base and cm_base in em:
                         matched_entry = entry
                         break
-                # Partial match (machine name without suffix)
-                if not matched_entry and current_machine:
-                    cm_base = current_machine.split('_')[0].strip()
-                    for entry in orca_presets:
-                        if not isinstance(entry, dict):
-                            continue
-                        em = entry.get('machine', '')
-                        if cm_base and cm_base in em:
-                            matched_entry = entry
-                            break
-                # Last resort: use the last entry (most recently used printer)
-                if not matched_entry:
-                    matched_entry = orca_presets[-1] if orca_presets else None
-
-                if matched_entry:
-                    s0['matched_machine'] = matched_entry.get('machine', '(none)')
-                    fc = matched_entry.get('filament_colors', '')
-                    if fc and '#' in fc:
-                        found_colors = fc
-                        found_in = 'orca_presets.filament_colors'
-                        # Extract names from filament, filament_01, filament_02, ...
-                        names = []
-                        base = matched_entry.get('filament', '')
-                        if base:
-                            names.append(base)
-                        for idx in range(1, 32):
-                            key = f'filament_{idx:02d}'
-                            val = matched_entry.get(key, '')
-                            if val:
-                                names.append(val)
-                            else:
-                                break
-                        if names:
-                            found_names = names
-
-        s0['found_colors'] = str(found_colors)[:200] if found_colors else '(none)'
-        s0['found_names'] = len(found_names)
-        s0['found_in'] = found_in or '(none)'
+            # Last resort: use the last entry (most recently used printer)
+            if not matched_entry:
+                matched_entry = orca_presets[-1] if orca_presets else None
+
+            if matched_entry:
+                s0['matched_machine'] = matched_entry.get('machine', '(none)')
+                fc = matched_entry.get('filament_colors', '')
+                if fc and '#' in fc:
+                    found_colors = fc
+                    found_in = 'orca_presets.filament_colors'
+                    found_names = _numbered_preset_names(matched_entry) or found_names
+
+    s0['found_colors'] = str(found_colors)[:200] if found_colors else '(none)'
+    s0['found_names'] = len(found_names)
+    s0['found_in'] = found_in or '(none)'
+
+    if found_colors:
+        sep = ',' if ',' in found_colors else ';'
+        colours = [c.strip() for c in found_colors.split(sep)]
+        filaments = []
+        for i in range(max(len(colours), len(found_names))):
+            colour = _normalize_hex(colours[i]) if i < len(colours) else ''
+            name = ''
+            if i < len(found_names) and found_names[i] is not None:
+                name = str(found_names[i])
+            base_name = re.sub(r'\s*@\s*.+$', '', name).strip()
+            ftype = 'PLA'
+            for t in ('PETG', 'ABS', 'TPU', 'ASA', 'PA', 'PC', 'PVA'):
+                if t.lower() in name.lower():
+                    ftype = t
+                    break
+            filaments.append(FilamentRecord(i+1, base_name, colour or '#808080', ftype))
+        if filaments:
+            has_colors = sum(1 for f in filaments if f.color != '#808080')
+            s0['status'] = f'ok:{has_colors}_colors/{len(filaments)}_slots'
+            return filaments, f'conf:{found_in}'
+    s0['status'] = 'no_colors_found'
+    return None
 
-        if found_colors:
-            sep = ',' if ',' in found_colors else ';'
-            colours = [c.strip() for c in found_colors.split(sep)]
-            filaments = []
-            for i in range(max(len(colours), len(found_names))):
-                colour = _normalize_hex(colours[i]) if i < len(colours) else ''
-                name = ''
-                if i < len(found_names) and found_names[i] is not None:
-                    name = str(found_names[i])
-                base_name = re.sub(r'\s*@\s*.+$', '', name).strip()
-                ftype = 'PLA'
-                for t in ('PETG', 'ABS', 'TPU', 'ASA', 'PA', 'PC', 'PVA'):
-                    if t.lower() in name.lower():
-                        ftype = t
-                        break
-                filaments.append({
-                    'slot': i+1, 'name': base_name, 'color': colour or '#808080',
-                    'type': ftype, 'vendor': ''
-                })
-            if filaments:
-                has_colors = sum(1 for f in filaments if f['color'] != '#808080')
-                s0['status'] = f'ok:{has_colors}_colors/{len(filaments)}_slots'
-                debug['strategies'].append(s0)
-                return {'status':'ok','count':len(filaments),'filaments':filaments,
-                        'source':f'conf:{found_in}','debug':debug}
-        s0['status'] = 'no_colors_found'
-    else:
-        s0['status'] = 'conf_unavailable'
-    debug['strategies'].append(s0)
 
-    # ── Strategy 1: conf → last_backup_path → Metadata/ ──
-    s1 = {'name': '1_backup_path'}
-    if conf_data:
-        backup_path = ''
-        app_sec = conf_data.get('app', {})
-        if isinstance(app_sec, dict):
-            backup_path = app_sec.get('last_backup_path', '')
-        if not backup_path:
-            backup_path = conf_data.get('last_backup_path', '')
-        if backup_path:
-            backup_path = backup_path.replace('/', os.sep)
-            s1['path'] = backup_path
-            meta_dir = os.path.join(backup_path, 'Metadata')
-            if os.path.isdir(meta_dir):
-                for cfg_name in ('project_settings.config', 'slice_info.config'):
-                    cfg_file = os.path.join(meta_dir, cfg_name)
-                    if not os.path.isfile(cfg_file):
-                        continue
-                    text = _try_read_file(cfg_file)
-                    if not text:
-                        continue
-                    filaments = _try_parse_any_format(text)
-                    if filaments:
-                        s1['status'] = f'ok:{cfg_name}'
-                        debug['strategies'].append(s1)
-                        return {'status':'ok','count':len(filaments),'filaments':filaments,
-                                'source':f'backup:{cfg_name}','debug':debug}
-                s1['status'] = 'no_colour_in_backup'
-                try: s1['metadata_files'] = os.listdir(meta_dir)[:15]
-                except: pass
-            else:
-                s1['status'] = 'metadata_dir_missing'
-        else:
-            s1['status'] = 'no_backup_path'
-    else:
+def _strategy_backup_path(ctx, s1):
+    """Strategy 1: conf → last_backup_path → Metadata/."""
+    conf_data = ctx['conf_data']
+    if not conf_data:
         s1['status'] = 'conf_unavailable'
-    debug['strategies'].append(s1)
+        return None
+    backup_path = _conf_backup_path(conf_data)
+    if not backup_path:
+        s1['status'] = 'no_backup_path'
+        return None
+    s1['path'] = backup_path
+    meta_dir = os.path.join(backup_path, 'Metadata')
+    io = ctx['io']
+    if not io.isdir(meta_dir):
+        s1['status'] = 'metadata_dir_missing'
+        return None
+    for cfg_name in ('project_settings.config', 'slice_info.config'):
+        if _cancelled(ctx, s1):
+            return None
+        cfg_file = os.path.join(meta_dir, cfg_name)
+        if not io.isfile(cfg_file):
+            continue
+        filaments = _parse_config_file(cfg_file, io)
+        if filaments:
+            s1['status'] = f'ok:{cfg_name}'
+            return filaments, f'backup:{cfg_name}'
+    s1['status'] = 'no_colour_in_backup'
+    try: s1['metadata_files'] = os.listdir(meta_dir)[:15]
+    except: pass
+    return None
+
 
-    # ── Strategy 2: %TEMP% model dir scan ──
-    s2 = {'name': '2_temp_scan'}
+def _strategy_temp_scan(ctx, s2):
+    """Strategy 2: %TEMP% model dir scan."""
     temp = tempfile.gettempdir()
     temp_dirs = ['bamboo_model']
-    if slicer_type == 'orca':
+    if ctx['slicer_type'] == 'orca':
         temp_dirs = ['orcaslicer_model', 'orca_model', 'bamboo_model']
     for td in temp_dirs:
         model_root = os.path.join(temp, td)
         s2['root'] = model_root
-        if not os.path.isdir(model_root):
+        io = ctx['io']
+        if not io.isdir(model_root):
             continue
-        configs = []
-        for rd, dirs, files in os.walk(model_root):
-            for fn in files:
-                if fn.lower().endswith('.config'):
-                    fp = os.path.join(rd, fn)
-                    try: configs.append((os.path.getmtime(fp), fp))
-                    except OSError: pass
-        configs.sort(reverse=True)
+        memo = ctx.get('memo')
+        if memo is None:
+            configs = _model_root_configs(model_root, io, ctx, s2)
+            if configs is None:
+                return None
+        else:
+            # Shared with the other pipeline, so one side's cancel must not cut it short
+            configs = memo.get(('temp_walk', model_root), _model_root_configs, model_root, io)
         s2['configs_found'] = len(configs)
         for _, fp in configs[:10]:
-            text = _try_read_file(fp)
-            if text:
-                filaments = _try_parse_any_format(text)
-                if filaments:
-                    s2['status'] = f'ok:{fp}'
-                    debug['strategies'].append(s2)
-                    return {'status':'ok','count':len(filaments),'filaments':filaments,
-                            'source':f'temp:{fp}','debug':debug}
+            if _cancelled(ctx, s2):
+                return None
+            filaments = _memoized(memo, ('config', fp), _parse_config_file, fp, io)
+            if filaments:
+                s2['status'] = f'ok:{fp}'
+                return filaments, f'temp:{fp}'
     s2['status'] = 'no_colour_in_temp'
-    debug['strategies'].append(s2)
+    return None
 
-    # ── Strategy 3: .3mf files (multi-source extraction) ──
-    s3 = {'name': '3_3mf_files'}
-    all_3mf = _collect_3mf_files(slicer_type, conf_data)
+
+def _strategy_3mf_files(ctx, s3):
+    """Strategy 3: .3mf files (multi-source extraction)."""
+    memo = ctx.get('memo')
+    all_3mf = _collect_3mf_files(ctx['slicer_type'], ctx['conf_data'], memo, ctx['io'])
     s3['total'] = len(all_3mf)
     s3['files'] = [os.path.basename(p) for _, p in all_3mf[:8]]
     s3['checked'] = []
     for _, path in all_3mf[:20]:
-        filaments, source, exdebug = _extract_all_from_3mf(path)
+        if _cancelled(ctx, s3):
+            return None
+        filaments, source, exdebug = _memoized(memo, ('3mf', path), _extract_all_from_3mf, path)
         check = {'file': os.path.basename(path),
                  'sources': [s.get('name','?')+':'+s.get('status','?')
                              for s in exdebug.get('sources_tried', [])]}
@@ -836,17 +1939,178 @@ def get_project_filaments(slicer_type='bambu'):
             check['count'] = len(filaments)
             s3['checked'].append(check)
             s3['matched'] = path
-            debug['strategies'].append(s3)
-            return {'status':'ok','count':len(filaments),'filaments':filaments,
-                    'source':f'3mf:{path}|{source}','debug':debug}
+            return filaments, f'3mf:{path}|{source}'
         s3['checked'].append(check)
     s3['status'] = 'none_matched'
-    debug['strategies'].append(s3)
-    return {'status':'empty','count':0,'filaments':[],'debug':debug}
+    return None
+
+
+_STRATEGIES = (
+    ('0_conf_json_presets', _strategy_conf_presets),
+    ('1_backup_path', _strategy_backup_path),
+    ('2_temp_scan', _strategy_temp_scan),
+    ('3_3mf_files', _strategy_3mf_files),
+)
+
+_scan_executor = None
+_scan_executor_lock = threading.Lock()
+
+
+def _scan_pool():
+    """Shared worker pool for concurrent strategy execution (created on first use)."""
+    global _scan_executor
+    with _scan_executor_lock:
+        if _scan_executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            _scan_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='ksb-scan')
+        return _scan_executor
+
+
+def _run_strategies_sequential(ctx, debug):
+    for name, fn in _STRATEGIES:
+        entry = {'name': name}
+        found = fn(ctx, entry)
+        debug['strategies'].append(entry)
+        if found:
+            return found
+    return None
+
+
+def _run_strategies_concurrent(ctx, debug, deadline=None):
+    """Start every strategy at once but accept results in priority order:
+    strategy N wins only after 0..N-1 have finished without a result.
+    Lower-priority work is cancelled as soon as a winner is confirmed.
+
+    With a deadline (time.monotonic() value) → (found, pending) where pending
+    is None when the outcome is final, else (futures, entries, next_index)
+    for the caller to finish in the background."""
+    from concurrent.futures import TimeoutError as FutureTimeout
+    pool = _scan_pool()
+    entries = [{'name': name} for name, _ in _STRATEGIES]
+    futures = [pool.submit(fn, ctx, entry)
+               for (_, fn), entry in zip(_STRATEGIES, entries)]
+    for i, fut in enumerate(futures):
+        timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+        try:
+            found = fut.result(timeout=timeout)
+        except FutureTimeout:
+            # Best so far: the highest-priority later strategy that already succeeded
+            best = None
+            for later in futures[i + 1:]:
+                if later.done() and not later.cancelled() and later.exception() is None \
+                        and later.result():
+                    best = later.result()
+                    break
+            return best, (futures, entries, i)
+        debug['strategies'].append(entries[i])
+        if found:
+            ctx['cancel'].set()
+            for later in futures[i + 1:]:
+                later.cancel()
+            return found, None
+    return None, None
+
+
+def _filament_result(found, debug, status='ok'):
+    if found:
+        filaments, source = found
+        return {'status':status,'count':len(filaments),'filaments':filaments,
+                'source':source,'debug':debug}
+    return {'status':'empty' if status == 'ok' else status,
+            'count':0,'filaments':[],'debug':debug}
+
+
+# Outcomes of scans that outlived their deadline, served once to the next
+# call if their inputs are unchanged
+BACKGROUND_RESULT_TTL = 60.0
+_background_results = {}
+_background_lock = threading.Lock()
+
+
+def _finish_in_background(slicer_type, ctx, debug, pending):
+    """Keep resolving strategies after a deadline and cache the final result."""
+    futures, entries, next_index = pending
+
+    def run():
+        found = None
+        try:
+            for i in range(next_index, len(futures)):
+                found = futures[i].result()
+                debug['strategies'].append(entries[i])
+                if found:
+                    ctx['cancel'].set()
+                    for later in futures[i + 1:]:
+                        later.cancel()
+                    break
+        except Exception as e:
+            debug['background_error'] = str(e)
+            return
+        debug['completed_in_background'] = True
+        result = _filament_result(found, debug)
+        inputs = _result_inputs(ctx, result)
+        with _background_lock:
+            _background_results[slicer_type] = (time.monotonic(), result, inputs)
+
+    threading.Thread(target=run, daemon=True).start()
+
+
+def _take_background_result(slicer_type):
+    with _background_lock:
+        entry = _background_results.pop(slicer_type, None)
+    if not entry or time.monotonic() - entry[0] > BACKGROUND_RESULT_TTL:
+        return None
+    # Same check as the warm-start result: any input changed → rescan
+    if not _sigs_valid(entry[2]):
+        return None
+    return entry[1]
+
+
+def get_project_filaments(slicer_type='bambu', mode='sequential', budget_ms=None, memo=None):
+    """Main: find and extract project filaments.
+    mode='concurrent' runs the strategies speculatively in parallel while
+    keeping the same precedence as the sequential chain.
+    budget_ms bounds the wait: when it runs out the best result found so far
+    is returned with status 'partial' and the scan finishes in the background,
+    its outcome being served to the next call.
+    memo is the ScanMemo shared with the other pipeline of a slicer=all scan."""
+    cached = _take_background_result(slicer_type) or _take_warm_result(slicer_type)
+    if cached is not None:
+        return cached
+
+    debug = {'strategies': []}
+
+    io = memo.io if memo is not None else ScanIO()
+    tokens, conf_path, conf_err = _read_conf_tokens(slicer_type, io)
+    conf_data = tokens['json'] if tokens else None
+    debug['conf'] = {'path': conf_path, 'ok': conf_data is not None, 'error': conf_err}
+
+    ctx = {'slicer_type': slicer_type, 'conf_data': conf_data, 'conf_path': conf_path,
+           'cancel': threading.Event(), 'memo': memo, 'io': io}
+    if budget_ms is not None:
+        debug['mode'] = 'concurrent'
+        debug['budget_ms'] = budget_ms
+        deadline = time.monotonic() + max(0, budget_ms) / 1000.0
+        found, pending = _run_strategies_concurrent(ctx, debug, deadline)
+        if pending:
+            partial_debug = dict(debug, strategies=list(debug['strategies']) + [
+                {'name': e['name'], 'status': 'pending'} for e in pending[1][pending[2]:]])
+            _finish_in_background(slicer_type, ctx, debug, pending)
+            partial_debug['io'] = io.report()
+            return _filament_result(found, partial_debug, status='partial')
+    elif mode == 'concurrent':
+        debug['mode'] = 'concurrent'
+        found, _ = _run_strategies_concurrent(ctx, debug)
+    else:
+        found = _run_strategies_sequential(ctx, debug)
+    result = _filament_result(found, debug)
+    _remember_result(ctx, result)
+    debug['io'] = io.report()
+    return result
 
 
 def _try_parse_any_format(text):
     """Try JSON, XML, INI to extract filaments from a config text."""
+    import xml.etree.ElementTree as ET
     stripped = text.lstrip()
     if stripped.startswith('{'):
         data, _ = _try_parse_json(text)
@@ -863,8 +2127,7 @@ def _try_parse_any_format(text):
                     fid = elem.get('id', '')
                     slot = int(fid) if fid.isdigit() else len(filaments)+1
                     ftype = elem.get('type', 'PLA')
-                    filaments.append({'slot':slot,'name':f'{ftype} #{fid}',
-                        'color':color,'type':ftype,'vendor':''})
+                    filaments.append(FilamentRecord(slot, f'{ftype} #{fid}', color, ftype))
             if filaments:
                 return filaments
         except ET.ParseError:
@@ -874,148 +2137,483 @@ def _try_parse_any_format(text):
     return None
 
 
-def debug_slicer_conf(slicer_type='bambu'):
-    """Diagnostic: dump conf contents including INI [presets] tail."""
-    result = {}
-    app = 'BambuStudio' if slicer_type != 'orca' else 'OrcaSlicer'
-    appdata = os.environ.get('APPDATA', '')
+# ── Diagnostics (/debug) ──
+# Sections are computed one at a time so /debug can stream them as NDJSON,
+# and only the requested ones are computed. The temp listing is paged and
+# the walk stops as soon as the page is full.
+
+DEBUG_SECTIONS = ('conf', 'user_presets', 'system_presets', 'temp', 'io')
+DEBUG_TEMP_LIMIT = 30
+
+
+def _debug_conf(slicer_type, conf_path, io):
+    result = {'conf_path': conf_path, 'conf_exists': io.isfile(conf_path)}
+    if not result['conf_exists']:
+        return result
+    raw = io.read_text(conf_path)
+    if not raw:
+        return result
+    result['conf_size'] = len(raw)
+    result['conf_first_500'] = raw[:500]
+    # CRITICAL: show the TAIL (where [presets] section lives!)
+    result['conf_last_2000'] = raw[-2000:]
+
+    # Same single-pass tokens the scanner uses (text comes from the memo)
+    tokens, _, err = _read_conf_tokens(slicer_type, io)
+    data = tokens['json']
+    if data:
+        result['conf_json_parsed'] = True
+        result['conf_json_keys'] = sorted(data.keys())
+        # Dump ALL potentially relevant sections
+        for k in ('presets', 'orca_presets', 'filaments', 'filament',
+                  'filament_colour', 'filament_color', 'custom_color_list'):
+            if k in data:
+                val = data[k]
+                if isinstance(val, (dict, list)):
+                    dumped = json.dumps(val, ensure_ascii=False)
+                    result[f'conf_json_{k}'] = json.loads(dumped) if len(dumped) < 2000 else dumped[:2000]
+                else:
+                    result[f'conf_json_{k}'] = val
+        app_sec = data.get('app', {})
+        if isinstance(app_sec, dict):
+            result['conf_last_backup'] = app_sec.get('last_backup_path', '(none)')
+    else:
+        result['conf_json_parsed'] = False
+        result['conf_json_error'] = err
+
+    # INI sections (after JSON or standalone)
+    ini_sections = tokens['sections']
+    result['conf_ini_sections'] = list(ini_sections.keys())
+    if 'presets' in ini_sections:
+        result['conf_presets'] = ini_sections['presets']
+    # Show ALL filament-related keys from any INI section
+    for sec_name, sec_data in ini_sections.items():
+        for k, v in sec_data.items():
+            if 'filament' in k.lower() or 'colour' in k.lower() or 'color' in k.lower():
+                result[f'ini_{sec_name}_{k}'] = v[:500] if len(v) > 500 else v
+    return result
+
+
+def _first_names(d, n):
+    """Up to n entry names of a directory, without listing the rest."""
+    names = []
+    with os.scandir(d) as it:
+        for e in it:
+            if len(names) >= n:
+                break
+            names.append(e.name)
+    return names
+
+
+def _debug_user_presets(user_dir, io):
+    result = {'user_dir': user_dir, 'user_dir_exists': io.isdir(user_dir)}
+    if not result['user_dir_exists']:
+        return result
+    # List user IDs
+    try:
+        user_ids = _first_names(user_dir, 5)
+        result['user_ids'] = user_ids
+        for uid in user_ids[:2]:
+            fil_dir = os.path.join(user_dir, uid, 'filament')
+            if io.isdir(fil_dir):
+                try:
+                    fils = _first_names(fil_dir, 20)
+                    result[f'user_{uid}_filaments'] = fils
+                    # Read first filament preset to show structure
+                    if fils:
+                        sample = os.path.join(fil_dir, fils[0])
+                        if io.isfile(sample):
+                            txt = io.read_text(sample)
+                            if txt:
+                                result[f'user_filament_sample_name'] = fils[0]
+                                result[f'user_filament_sample_first500'] = txt[:500]
+                except (PermissionError, OSError):
+                    pass
+    except (PermissionError, OSError):
+        pass
+    return result
 
-    conf_path = os.path.join(appdata, app, f'{app}.conf')
-    result['conf_path'] = conf_path
-    result['conf_exists'] = os.path.isfile(conf_path)
-    if os.path.isfile(conf_path):
-        raw = _try_read_file(conf_path)
-        if raw:
-            result['conf_size'] = len(raw)
-            result['conf_first_500'] = raw[:500]
-            # CRITICAL: show the TAIL (where [presets] section lives!)
-            result['conf_last_2000'] = raw[-2000:]
-
-            # Try JSON parse (gets the first JSON object)
-            data, err = _try_parse_json(raw)
-            if data:
-                result['conf_json_parsed'] = True
-                result['conf_json_keys'] = sorted(data.keys())
-                # Dump ALL potentially relevant sections
-                for k in ('presets', 'orca_presets', 'filaments', 'filament',
-                          'filament_colour', 'filament_color', 'custom_color_list'):
-                    if k in data:
-                        val = data[k]
-                        if isinstance(val, (dict, list)):
-                            dumped = json.dumps(val, ensure_ascii=False)
-                            result[f'conf_json_{k}'] = json.loads(dumped) if len(dumped) < 2000 else dumped[:2000]
-                        else:
-                            result[f'conf_json_{k}'] = val
-                app_sec = data.get('app', {})
-                if isinstance(app_sec, dict):
-                    result['conf_last_backup'] = app_sec.get('last_backup_path', '(none)')
-            else:
-                result['conf_json_parsed'] = False
-                result['conf_json_error'] = err
-
-            # Parse INI sections (after JSON or standalone)
-            ini_sections = _parse_conf_ini_sections(raw)
-            result['conf_ini_sections'] = list(ini_sections.keys())
-            if 'presets' in ini_sections:
-                result['conf_presets'] = ini_sections['presets']
-            # Show ALL filament-related keys from any INI section
-            for sec_name, sec_data in ini_sections.items():
-                for k, v in sec_data.items():
-                    if 'filament' in k.lower() or 'colour' in k.lower() or 'color' in k.lower():
-                        result[f'ini_{sec_name}_{k}'] = v[:500] if len(v) > 500 else v
-
-    # User filament preset directory
-    user_dir = os.path.join(appdata, app, 'user')
-    result['user_dir'] = user_dir
-    result['user_dir_exists'] = os.path.isdir(user_dir)
-    if os.path.isdir(user_dir):
-        # List user IDs
-        try:
-            user_ids = os.listdir(user_dir)
-            result['user_ids'] = user_ids[:5]
-            for uid in user_ids[:2]:
-                fil_dir = os.path.join(user_dir, uid, 'filament')
-                if os.path.isdir(fil_dir):
-                    try:
-                        fils = os.listdir(fil_dir)
-                        result[f'user_{uid}_filaments'] = fils[:20]
-                        # Read first filament preset to show structure
-                        if fils:
-                            sample = os.path.join(fil_dir, fils[0])
-                            if os.path.isfile(sample):
-                                txt = _try_read_file(sample)
-                                if txt:
-                                    result[f'user_filament_sample_name'] = fils[0]
-                                    result[f'user_filament_sample_first500'] = txt[:500]
-                    except (PermissionError, OSError):
-                        pass
-        except (PermissionError, OSError):
-            pass
 
-    # System filament presets
+def _debug_system_presets(slicer_type, appdata, app, io):
     sys_fil_dir = os.path.join(appdata, app, 'system', 'Bambu', 'filament')
-    if not os.path.isdir(sys_fil_dir):
+    if not io.isdir(sys_fil_dir):
         # Try program files
         for pf in [os.environ.get('ProgramFiles', ''), os.environ.get('ProgramFiles(x86)', '')]:
             prog_name = 'Bambu Studio' if slicer_type != 'orca' else 'OrcaSlicer'
             d = os.path.join(pf, prog_name, 'resources', 'profiles', 'Bambu', 'filament')
-            if os.path.isdir(d):
+            if io.isdir(d):
                 sys_fil_dir = d
                 break
-    result['system_filament_dir'] = sys_fil_dir
-    result['system_filament_exists'] = os.path.isdir(sys_fil_dir)
+    return {'system_filament_dir': sys_fil_dir,
+            'system_filament_exists': io.isdir(sys_fil_dir)}
 
-    # Temp dir (check bamboo_model, orcaslicer_model, orca_model)
-    temp = tempfile.gettempdir()
-    temp_dirs = ['bamboo_model']
-    if slicer_type == 'orca':
-        temp_dirs = ['orcaslicer_model', 'orca_model', 'bamboo_model']
-    for td in temp_dirs:
-        model_root = os.path.join(temp, td)
-        result[f'temp_dir_{td}'] = model_root
-        result[f'temp_exists_{td}'] = os.path.isdir(model_root)
-        if os.path.isdir(model_root):
-            all_files = []
-            for rd, ds, fs in os.walk(model_root):
-                for fn in fs:
-                    fp = os.path.join(rd, fn)
-                    rel = os.path.relpath(fp, model_root)
-                    try:
-                        all_files.append(f'{rel} ({os.path.getsize(fp)}B)')
-                    except OSError:
-                        all_files.append(rel)
-            result[f'temp_files_{td}'] = all_files[:30]
 
+def _debug_temp_dir(td, model_root, limit, offset, io):
+    """One page of a temp model root; the walk stops once the page is full."""
+    result = {f'temp_dir_{td}': model_root, f'temp_exists_{td}': io.isdir(model_root)}
+    if not result[f'temp_exists_{td}']:
+        return result
+    page = []
+    seen = 0
+    truncated = False
+    for rd, ds, fs in os.walk(model_root):
+        for fn in fs:
+            seen += 1
+            if seen <= offset:
+                continue
+            if len(page) >= limit:
+                truncated = True
+                break
+            fp = os.path.join(rd, fn)
+            rel = os.path.relpath(fp, model_root)
+            st = io.stat(fp)
+            page.append(f'{rel} ({st.st_size}B)' if st else rel)
+        if truncated:
+            break
+    result[f'temp_files_{td}'] = page
+    if truncated:
+        result[f'temp_next_offset_{td}'] = offset + limit
     return result
 
 
-def _parse_conf_ini_sections(text):
-    """Extract INI [sections] from BambuStudio.conf (may follow JSON block).
-    Returns dict of {section_name: {key: value, ...}}.
-    """
-    sections = {}
-    current_section = None
+def iter_debug_sections(slicer_type='bambu', sections=None, limit=DEBUG_TEMP_LIMIT,
+                        offset=0, io=None):
+    """Yield (section, {key: value}) diagnostics as each one is computed.
+    sections limits which are computed; limit/offset page the temp listing."""
+    io = io or ScanIO()
+    want = set(sections) if sections else set(DEBUG_SECTIONS)
+    app = 'BambuStudio' if slicer_type != 'orca' else 'OrcaSlicer'
+    appdata = os.environ.get('APPDATA', '')
+
+    if 'conf' in want:
+        yield 'conf', _debug_conf(slicer_type, os.path.join(appdata, app, f'{app}.conf'), io)
+    if 'user_presets' in want:
+        yield 'user_presets', _debug_user_presets(os.path.join(appdata, app, 'user'), io)
+    if 'system_presets' in want:
+        yield 'system_presets', _debug_system_presets(slicer_type, appdata, app, io)
+    if 'temp' in want:
+        # Temp dir (check bamboo_model, orcaslicer_model, orca_model)
+        temp = tempfile.gettempdir()
+        temp_dirs = ['bamboo_model']
+        if slicer_type == 'orca':
+            temp_dirs = ['orcaslicer_model', 'orca_model', 'bamboo_model']
+        for td in temp_dirs:
+            yield 'temp', _debug_temp_dir(td, os.path.join(temp, td), limit, offset, io)
+    if 'io' in want:
+        yield 'io', {'io': io.report()}
+
+
+def debug_slicer_conf(slicer_type='bambu', io=None, **kwargs):
+    """Diagnostic: dump conf contents including INI [presets] tail.
+    All sections of iter_debug_sections merged into one dict."""
+    result = {}
+    for _, part in iter_debug_sections(slicer_type, io=io, **kwargs):
+        result.update(part)
+    return result
+
+
+# =====================================================
+# Warm-start state snapshot
+# Last filament results, the slicer registry, the .3mf candidate index and
+# the preset colour index are written to STATE_FILE on change (debounced)
+# and at shutdown, and reloaded at startup. Everything is revalidated by
+# mtime/size signatures before use; the snapshot result is only served to
+# the first request per slicer after boot.
+# =====================================================
+STATE_FILE = os.path.join(INSTALL_DIR, "state.json")
+STATE_VERSION = 4
+STATE_SAVE_DELAY = 5.0
+
+_state_lock = threading.RLock()
+_state = {'dirty': False, 'timer': None}
+_last_results = {}
+_warm_results = {}
+_candidate_index = {}
+_preset_color_cache = {}
+
+
+def _stat_sig(path, io=None):
+    """[mtime_ns, size] of a path, or None if it does not exist."""
+    if io is not None:
+        st = io.stat(path)
+    else:
+        try:
+            st = os.stat(path)
+        except OSError:
+            st = None
+    return [st.st_mtime_ns, st.st_size] if st is not None else None
+
+
+def _stat_sigs(paths, io=None):
+    return {p: _stat_sig(p, io) for p in paths}
+
+
+def _sigs_valid(inputs):
+    return all(_stat_sig(p) == sig for p, sig in inputs.items())
+
+
+def _result_inputs(ctx, result):
+    """Files and directories whose change could change a filament result."""
+    slicer_type = ctx['slicer_type']
+    paths = [ctx['conf_path']]
+    backup = _conf_backup_path(ctx['conf_data'])
+    if backup:
+        meta_dir = os.path.join(backup, 'Metadata')
+        paths += [meta_dir, os.path.join(meta_dir, 'project_settings.config'),
+                  os.path.join(meta_dir, 'slice_info.config')]
+    temp = tempfile.gettempdir()
+    paths += [os.path.join(temp, td) for td in
+              (('orcaslicer_model', 'orca_model', 'bamboo_model')
+               if slicer_type == 'orca' else ('bamboo_model',))]
+    paths += _3mf_scan_dirs(slicer_type)
+    with _state_lock:
+        entry = _candidate_index.get(slicer_type)
+    if entry:
+        paths += entry['paths'][:20]
+    source = result.get('source', '')
+    if source.startswith('temp:'):
+        paths.append(source[5:])
+    elif source.startswith('3mf:'):
+        paths.append(source[4:].split('|')[0])
+    return _stat_sigs(dict.fromkeys(paths), ctx.get('io'))
+
+
+def _pack_result(result):
+    """Snapshot form of a result: filament records become positional rows."""
+    return dict(result, filaments=[f.to_row() for f in result.get('filaments', [])])
+
+
+def _unpack_result(packed):
+    return dict(packed, filaments=[FilamentRecord.from_row(r) for r in packed.get('filaments', [])])
+
+
+def _remember_result(ctx, result):
+    """Record a freshly computed result for the snapshot; marks it dirty on change."""
+    if result.get('status') not in ('ok', 'empty'):
+        return
+    compact = {k: v for k, v in result.items() if k != 'debug'}
+    inputs = _result_inputs(ctx, result)
+    with _state_lock:
+        prev = _last_results.get(ctx['slicer_type'])
+        _last_results[ctx['slicer_type']] = {'result': compact, 'inputs': inputs}
+    if not prev or prev['result'] != compact or prev['inputs'] != inputs:
+        _mark_state_dirty()
+
+
+def _take_warm_result(slicer_type):
+    """Serve the snapshot result once after boot if its inputs are unchanged."""
+    with _state_lock:
+        entry = _warm_results.pop(slicer_type, None)
+    if not entry or not _sigs_valid(entry['inputs']):
+        return None
+    result = dict(entry['result'])
+    result['debug'] = {'warm_start': True, 'saved_at': entry.get('saved_at')}
+    return result
+
+
+def _mark_state_dirty():
+    with _state_lock:
+        _state['dirty'] = True
+        if _state['timer'] is None:
+            timer = threading.Timer(STATE_SAVE_DELAY, save_state_snapshot)
+            timer.daemon = True
+            _state['timer'] = timer
+            timer.start()
 
-    # Find where INI starts — look for [section] headers
-    for line in text.splitlines():
-        stripped = line.strip()
-        # Skip JSON content
-        if stripped.startswith('{') or stripped.startswith('}'):
-            continue
-        # Section header
-        m = re.match(r'^\[([^\]]+)\]$', stripped)
-        if m:
-            current_section = m.group(1).lower()
-            sections[current_section] = {}
-            continue
-        # Key = value in a section
-        if current_section and '=' in stripped:
-            idx = stripped.index('=')
-            key = stripped[:idx].strip()
-            val = stripped[idx+1:].strip()
-            sections[current_section][key] = val
 
-    return sections
+def save_state_snapshot():
+    """Write the snapshot if anything changed since the last write."""
+    with _state_lock:
+        _state['timer'] = None
+        if not _state['dirty']:
+            return
+        _state['dirty'] = False
+        snapshot = {
+            'version': STATE_VERSION,
+            'saved_at': time.time(),
+            'slicers': {k: v[0] for k, v in _slicer_registry.items() if v[0]},
+            'results': {k: dict(v, result=_pack_result(v['result']))
+                        for k, v in _last_results.items()},
+            'candidates': _candidate_index,
+            'preset_colors': _preset_color_cache,
+        }
+        data = json.dumps(snapshot, ensure_ascii=False, separators=(',', ':'))
+    try:
+        os.makedirs(INSTALL_DIR, exist_ok=True)
+        tmp = STATE_FILE + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(data)
+        os.replace(tmp, STATE_FILE)
+    except OSError as e:
+        print(f"[State] Save error: {e}")
+
+
+def load_state_snapshot():
+    """Reload and revalidate the snapshot written by a previous run."""
+    try:
+        with open(STATE_FILE, 'r', encoding='utf-8') as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError):
+        return False
+    if not isinstance(snapshot, dict) or snapshot.get('version') != STATE_VERSION:
+        return False
+    now = time.monotonic()
+    with _state_lock:
+        for stype, path in snapshot.get('slicers', {}).items():
+            if path and os.path.isfile(path):
+                _slicer_registry.setdefault(stype, (path, now))
+        for stype, entry in snapshot.get('results', {}).items():
+            try:
+                entry = dict(entry, result=_unpack_result(entry['result']))
+            except (KeyError, TypeError):
+                continue
+            if _sigs_valid(entry.get('inputs', {})):
+                _warm_results[stype] = dict(entry, saved_at=snapshot.get('saved_at'))
+                _last_results.setdefault(stype, entry)
+        # Index caches are revalidated on every use, so they load as-is
+        for stype, entry in snapshot.get('candidates', {}).items():
+            _candidate_index.setdefault(stype, entry)
+        for app, entry in snapshot.get('preset_colors', {}).items():
+            _preset_color_cache.setdefault(app, entry)
+    return True
+
+
+# =====================================================
+# Nearest-colour preset index
+# Preset colours are converted to CIELAB (D65) and held in a 3-d k-d tree,
+# so a detected slot colour maps to the perceptually closest known presets
+# (ΔE76) in O(log n) per query instead of a scan over every preset.
+# =====================================================
+COLOR_MATCH_K = 3
+COLOR_MATCH_MAX_K = 20
+
+
+def _srgb_to_linear(c):
+    c /= 255.0
+    return c / 12.92 if c <= 0.04045 else ((c + 0.055) / 1.055) ** 2.4
+
+
+def _lab_f(t):
+    return t ** (1.0 / 3.0) if t > 0.008856 else 7.787 * t + 16.0 / 116.0
+
+
+def hex_to_lab(colour):
+    """'#RRGGBB' → (L*, a*, b*) under D65."""
+    r, g, b = (_srgb_to_linear(int(colour[i:i + 2], 16)) for i in (1, 3, 5))
+    x = (0.4124 * r + 0.3576 * g + 0.1805 * b) / 0.95047
+    y = 0.2126 * r + 0.7152 * g + 0.0722 * b
+    z = (0.0193 * r + 0.1192 * g + 0.9505 * b) / 1.08883
+    fx, fy, fz = _lab_f(x), _lab_f(y), _lab_f(z)
+    return (116.0 * fy - 16.0, 500.0 * (fx - fy), 200.0 * (fy - fz))
+
+
+class ColorIndex:
+    """k-d tree over [name, colour, type, vendor] preset rows in CIELAB.
+    Nodes live in parallel lists (point, left, right, axis); -1 is a leaf edge."""
+
+    def __init__(self, entries):
+        seen = set()
+        self.entries = []
+        for row in entries:
+            key = (row[0].lower(), row[1])
+            if key not in seen:
+                seen.add(key)
+                self.entries.append(row)
+        self._lab = [hex_to_lab(row[1]) for row in self.entries]
+        self._point = []
+        self._left = []
+        self._right = []
+        self._axis = []
+        self._root = self._build(list(range(len(self.entries))), 0)
+
+    def _build(self, idx, depth):
+        if not idx:
+            return -1
+        axis = depth % 3
+        idx.sort(key=lambda i: self._lab[i][axis])
+        mid = len(idx) // 2
+        node = len(self._point)
+        self._point.append(idx[mid])
+        self._axis.append(axis)
+        self._left.append(-1)
+        self._right.append(-1)
+        self._left[node] = self._build(idx[:mid], depth + 1)
+        self._right[node] = self._build(idx[mid + 1:], depth + 1)
+        return node
+
+    def __len__(self):
+        return len(self.entries)
+
+    def nearest(self, colour, k=COLOR_MATCH_K):
+        """The k presets closest to '#RRGGBB' → [(delta_e, row)], closest first."""
+        import heapq
+        q = hex_to_lab(colour)
+        heap = []  # (-dist², entry index): the worst kept match on top
+        # (node, squared distance to its splitting plane), nearer side popped first
+        stack = [(self._root, 0.0)] if self._root >= 0 else []
+        lab, point, axes = self._lab, self._point, self._axis
+        while stack:
+            node, plane = stack.pop()
+            if len(heap) == k and plane >= -heap[0][0]:
+                continue
+            i = point[node]
+            p = lab[i]
+            d = (q[0] - p[0]) ** 2 + (q[1] - p[1]) ** 2 + (q[2] - p[2]) ** 2
+            if len(heap) < k:
+                heapq.heappush(heap, (-d, i))
+            elif d < -heap[0][0]:
+                heapq.heapreplace(heap, (-d, i))
+            diff = q[axes[node]] - p[axes[node]]
+            near, far = (self._left[node], self._right[node]) if diff < 0 else \
+                (self._right[node], self._left[node])
+            if far >= 0:
+                stack.append((far, max(plane, diff * diff)))
+            if near >= 0:
+                stack.append((near, plane))
+        return [((-nd) ** 0.5, self.entries[i]) for nd, i in sorted(heap, reverse=True)]
+
+    def nearest_many(self, colours, k=COLOR_MATCH_K):
+        """Batch form of nearest() for all AMS slots at once; slots that share
+        a colour share one search."""
+        found = {}
+        for colour in colours:
+            if colour not in found:
+                found[colour] = self.nearest(colour, k)
+        return [found[colour] for colour in colours]
+
+
+_color_indexes = {}
+
+
+def preset_color_index(slicer_type='bambu'):
+    """ColorIndex over the resolved presets that have a colour (own or
+    inherited); rebuilt when the preset index changes."""
+    presets = preset_index(slicer_type)
+    with _state_lock:
+        cached = _color_indexes.get(slicer_type)
+        if cached and cached[0] is presets:
+            return cached[1]
+    index = ColorIndex([row for row in presets.resolved_rows() if row[1]])
+    with _state_lock:
+        _color_indexes[slicer_type] = (presets, index)
+    return index
+
+
+def match_colors(slicer_type, colours, k=COLOR_MATCH_K):
+    """→ [{'color', 'nearest': [{name, color, type, vendor, delta_e}]}] per
+    input colour; unparseable colours get an empty list."""
+    index = preset_color_index(slicer_type)
+    normalized = [_normalize_hex(raw) for raw in colours]
+    valid = [c for c in normalized if c] if len(index) else []
+    results = iter(index.nearest_many(valid, k))
+    out = []
+    for raw, colour in zip(colours, normalized):
+        matches = next(results) if colour and len(index) else []
+        out.append({'color': colour or raw, 'nearest': [
+            {'name': row[0], 'color': row[1], 'type': row[2], 'vendor': row[3],
+             'delta_e': round(de, 2)} for de, row in matches]})
+    return out
+
 
 # Embedded SVG data for icon generation
 KEYCAP_SVG = '''<?xml version="1.0" encoding="UTF-8"?>
@@ -1145,8 +2743,55 @@ def create_keycap_icon(size=64):
     return img
 
 
+# Rendered bitmaps are cached as PNG by (size, renderer, SVG hash); bump
+# ICON_RENDER_REV when create_keycap_icon's drawing changes.
+ICON_CACHE_DIR = os.path.join(INSTALL_DIR, "icon-cache")
+ICON_RENDER_REV = "1"
+# Renderer the last render actually used: cairosvg can be installed without
+# a loadable cairo library, and then renders fall back to PIL
+_icon_state = {'renderer': None}
+
+
+def _icon_renderer():
+    """Renderer the next render should use: the one that last worked, else
+    'cairo' when cairosvg is installed, else 'pil' (without importing it)."""
+    if _icon_state['renderer']:
+        return _icon_state['renderer']
+    import importlib.util
+    return 'cairo' if importlib.util.find_spec('cairosvg') else 'pil'
+
+
+def _icon_cache_path(size, renderer):
+    digest = hashlib.sha1((ICON_RENDER_REV + KEYCAP_SVG).encode('utf-8')).hexdigest()[:12]
+    return os.path.join(ICON_CACHE_DIR, f"icon-{size}-{renderer}-{digest}.png")
+
+
 def create_keycap_icon_from_svg(size=64):
-    """Try to use cairosvg for perfect SVG rendering, fallback to PIL"""
+    """Keycap icon at `size`, decoded from the on-disk cache when available."""
+    from PIL import Image
+    path = _icon_cache_path(size, _icon_renderer())
+    try:
+        with Image.open(path) as cached:
+            return cached.convert('RGBA')
+    except (OSError, ValueError):
+        pass
+    img, renderer = _render_keycap_icon_from_svg(size)
+    _icon_state['renderer'] = renderer
+    # Keyed by the renderer that produced the image, not the one expected
+    path = _icon_cache_path(size, renderer)
+    try:
+        os.makedirs(ICON_CACHE_DIR, exist_ok=True)
+        tmp = path + '.tmp'
+        img.save(tmp, format='PNG')
+        os.replace(tmp, path)
+    except OSError:
+        pass
+    return img
+
+
+def _render_keycap_icon_from_svg(size=64):
+    """Try to use cairosvg for perfect SVG rendering, fallback to PIL.
+    → (image, 'cairo' or 'pil')"""
     try:
         import cairosvg
         from PIL import Image
@@ -1162,17 +2807,47 @@ def create_keycap_icon_from_svg(size=64):
         pad = int(size * 0.1)
         svg_resized = svg_img.resize((size - 2 * pad, size - 2 * pad), Image.LANCZOS)
         bg.paste(svg_resized, (pad, pad + int(size * 0.05)), svg_resized)
-        return bg
+        return bg, 'cairo'
     except Exception:
-        return create_keycap_icon(size)
+        return create_keycap_icon(size), 'pil'
+
+
+ICON_SIZES = [16, 24, 32, 48, 64, 128, 256]
+# Sizes below this are rendered directly: their strokes are clamped to
+# >= 1px, which downsampling from the master would thin out.
+ICON_DERIVE_MIN = 32
+# Max mean per-channel difference (0-255) of a derived size vs a direct render
+ICON_DERIVE_TOLERANCE = 8.0
+
+
+def derive_icon_sizes(master, sizes):
+    """Successively downsample one large image → {size: image}.
+    Halves (2x2 average) while >= 2x the target, then one LANCZOS step."""
+    from PIL import Image
+    out = {}
+    current = master
+    for sz in sorted(set(sizes), reverse=True):
+        while current.width >= sz * 2:
+            current = current.reduce(2)
+        out[sz] = current.copy() if current.width == sz else current.resize((sz, sz), Image.LANCZOS)
+    return out
+
+
+def render_icon_sizes(sizes=None, render=None):
+    """Render the largest size once and derive the others from it."""
+    sizes = sizes or ICON_SIZES
+    render = render or create_keycap_icon_from_svg
+    largest = max(sizes)
+    derived = derive_icon_sizes(render(largest),
+                                [s for s in sizes if s >= ICON_DERIVE_MIN or s == largest])
+    return [derived[s] if s in derived else render(s) for s in sizes]
 
 
 def create_icon_file(path, sizes=None):
     """Create .ico file with multiple sizes"""
-    from PIL import Image
     if sizes is None:
-        sizes = [16, 24, 32, 48, 64, 128, 256]
-    images = [create_keycap_icon_from_svg(sz) for sz in sizes]
+        sizes = ICON_SIZES
+    images = render_icon_sizes(sizes)
     images[0].save(path, format='ICO', sizes=[(s, s) for s in sizes], append_images=images[1:])
     return path
 
@@ -1454,6 +3129,7 @@ def create_shortcut():
             f'if (Test-Path "{ico_path}") {{ $s.IconLocation = "{ico_path}" }}; '
             f'$s.Save()'
         )
+        import subprocess
         subprocess.run(['powershell', '-Command', ps_cmd],
                        capture_output=True, timeout=10,
                        creationflags=0x08000000 if sys.platform == 'win32' else 0)
@@ -1490,6 +3166,7 @@ def do_uninstall():
         with open(bat_path, 'w') as f:
             f.write(bat_content)
 
+        import subprocess
         subprocess.Popen(
             ['cmd', '/c', bat_path],
             creationflags=0x08000000 if sys.platform == 'win32' else 0
@@ -1508,7 +3185,31 @@ def do_uninstall():
 # =====================================================
 # Slicer Detection
 # =====================================================
+SLICER_MISS_TTL = 30.0
+_slicer_registry = {}
+
+
 def find_slicer(slicer_type):
+    """Resolve a slicer executable; hits are cached while the file exists,
+    misses for SLICER_MISS_TTL seconds."""
+    with _state_lock:
+        cached = _slicer_registry.get(slicer_type)
+    if cached:
+        path, checked = cached
+        if path and os.path.isfile(path):
+            return path
+        if not path and time.monotonic() - checked < SLICER_MISS_TTL:
+            return None
+    path = _resolve_slicer(slicer_type)
+    with _state_lock:
+        changed = (cached or (None,))[0] != path
+        _slicer_registry[slicer_type] = (path, time.monotonic())
+    if changed:
+        _mark_state_dirty()
+    return path
+
+
+def _resolve_slicer(slicer_type):
     paths = SLICER_PATHS.get(slicer_type, [])
     for p in paths:
         if os.path.isfile(p):
@@ -1549,37 +3250,951 @@ def is_origin_allowed(origin):
     return any(origin.startswith(a) for a in ALLOWED_ORIGINS)
 
 
+def cors_headers(origin):
+    """CORS response headers for a request Origin → [(name, value)]."""
+    return [
+        ('Access-Control-Allow-Origin',
+         (origin or '*') if is_origin_allowed(origin) else 'null'),
+        ('Access-Control-Allow-Methods', 'GET, POST, PUT, DELETE, OPTIONS'),
+        ('Access-Control-Allow-Headers', 'Content-Type, Content-Encoding, If-None-Match'),
+        ('Access-Control-Expose-Headers', 'ETag'),
+        ('Access-Control-Max-Age', '86400'),
+    ]
+
+
+def open_in_slicer(slicer_type, file_path, filename):
+    """Launch the slicer on a saved model file → (http_status, payload)."""
+    name = "Bambu Studio" if slicer_type == "bambu" else "OrcaSlicer"
+    slicer_path = find_slicer(slicer_type)
+    if not slicer_path:
+        return 404, {"error": f"{name} not found",
+                     "message": f"{name}が見つかりません。"}
+    import subprocess
+    subprocess.Popen([slicer_path, file_path])
+    return 200, {
+        "success": True,
+        "message": f"{name}でモデルを開きました",
+        "slicer": name, "file": filename
+    }
+
+
+# =====================================================
+# Request coalescing (single-flight)
+# Concurrent callers asking for the same key wait on one in-flight
+# computation and all receive its result.
+# =====================================================
+class SingleFlight:
+    """Collapse concurrent calls with the same key into one execution.
+    label(key) names the stats bucket a key is counted under."""
+
+    def __init__(self, label=None):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._label = label or (lambda key: key)
+        self.stats = {}
+
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            st = self.stats.setdefault(self._label(key), {'executed': 0, 'coalesced': 0})
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = {'event': threading.Event(),
+                                           'result': None, 'error': None}
+                st['executed'] += 1
+            else:
+                st['coalesced'] += 1
+        if not leader:
+            call['event'].wait()
+        else:
+            try:
+                call['result'] = fn(*args, **kwargs)
+            except Exception as e:
+                call['error'] = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call['event'].set()
+        if call['error'] is not None:
+            raise call['error']
+        # Each caller gets its own top-level dict (handlers pop 'debug' etc.)
+        return dict(call['result'])
+
+
+# Keyed by (slicer type, mode, budget_ms): only calls that would compute the
+# same result share one, and a budgeted call never waits on an unbudgeted
+# scan (nor an unbudgeted one on a partial result); stats stay per slicer type
+_filament_scans = SingleFlight(label=lambda key: key[0])
+
+
+def scan_project_filaments(slicer_type='bambu', mode='sequential', budget_ms=None, memo=None):
+    """get_project_filaments, coalesced across concurrent requests with the same options."""
+    slicer_type = 'orca' if slicer_type == 'orca' else 'bambu'
+    mode = 'concurrent' if mode == 'concurrent' else 'sequential'
+    return _filament_scans.do((slicer_type, mode, budget_ms), get_project_filaments,
+                              slicer_type, mode, budget_ms, memo)
+
+
+def scan_all_project_filaments(mode='sequential', budget_ms=None):
+    """slicer=all: run the bambu and orca pipelines concurrently. They share
+    one ScanMemo, so the bamboo_model walk, config parses, directory
+    listings and .3mf extractions they have in common happen once."""
+    memo = ScanMemo()
+    results = {}
+
+    def run(slicer_type):
+        try:
+            results[slicer_type] = scan_project_filaments(slicer_type, mode, budget_ms, memo)
+        except Exception as e:
+            results[slicer_type] = {'status': 'error', 'error': str(e)}
+
+    worker = threading.Thread(target=run, args=('bambu',), daemon=True)
+    worker.start()
+    run('orca')
+    worker.join()
+    return {'status': 'ok',
+            'results': {'bambu': results['bambu'], 'orca': results['orca']},
+            'debug': {'shared_work': dict(memo.stats), 'io': memo.io.report()}}
+
+
+# =====================================================
+# Filament change feed (Server-Sent Events)
+# One watcher thread per slicer type runs while anyone is subscribed. It
+# stats the input files of the last result (_result_inputs) and rescans
+# only when one of them changed, pushing when the content hash changes.
+# =====================================================
+FEED_CHECK_INTERVAL = 1.0
+FEED_HEARTBEAT = 15.0
+
+
+def filament_result_digest(result):
+    """Stable content hash of a filament result, ignoring the debug tree."""
+    core = {k: v for k, v in result.items() if k != 'debug'}
+    raw = _json_digest_encoder.encode(core).encode('utf-8')
+    return hashlib.sha1(raw).hexdigest()[:16]
+
+
+def filament_result_etag(result):
+    """Weak ETag of a /project-filaments body. The debug tree (timings, I/O
+    counters) differs between identical scans, so it is left out."""
+    if 'results' in result:
+        core = ','.join(f'{k}:{filament_result_digest(v)}'
+                        for k, v in sorted(result['results'].items()))
+        digest = hashlib.sha1(core.encode('utf-8')).hexdigest()[:16]
+    else:
+        digest = filament_result_digest(result)
+    return f'W/"{digest}"'
+
+
+class FilamentFeed:
+    """Shared background computation of get_project_filaments for SSE clients."""
+
+    def __init__(self, slicer_type):
+        self.slicer_type = slicer_type
+        self.digest = None
+        self.payload = None
+        self._subscribers = []
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def subscribe(self, callback):
+        """Register callback(digest, payload) for changes, which are delivered
+        on the feed thread. The current payload, if one exists, is delivered
+        right away on the caller's thread. Returns an unsubscribe fn."""
+        with self._lock:
+            self._subscribers.append(callback)
+            digest, payload = self.digest, self.payload
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+        if digest:
+            callback(digest, payload)
+        return lambda: self._unsubscribe(callback)
+
+    def _unsubscribe(self, callback):
+        with self._lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+    def _inputs(self, result):
+        """Input signatures behind a result: the ones recorded by the scan
+        itself when it was remembered, else taken now. None (rescan on the
+        next check) for partial and failed scans."""
+        if result.get('status') not in ('ok', 'empty'):
+            return None
+        with _state_lock:
+            last = _last_results.get(self.slicer_type)
+        if last and last['result'] == result:
+            return last['inputs']
+        tokens, conf_path, _ = _read_conf_tokens(self.slicer_type)
+        ctx = {'slicer_type': self.slicer_type, 'conf_path': conf_path,
+               'conf_data': tokens['json'] if tokens else None}
+        return _result_inputs(ctx, result)
+
+    def _run(self):
+        inputs = None
+        while True:
+            with self._lock:
+                if not self._subscribers:
+                    self._thread = None
+                    return
+            if inputs is None or not _sigs_valid(inputs):
+                try:
+                    result = scan_project_filaments(self.slicer_type)
+                except Exception as e:
+                    result = {'status': 'error', 'error': str(e)}
+                # The single-flight result is shared with HTTP callers: copy
+                result = {k: v for k, v in result.items() if k != 'debug'}
+                inputs = self._inputs(result)
+                digest = filament_result_digest(result)
+                if digest != self.digest:
+                    result['hash'] = digest
+                    with self._lock:
+                        self.digest, self.payload = digest, result
+                        subscribers = list(self._subscribers)
+                    for cb in subscribers:
+                        cb(digest, result)
+            time.sleep(FEED_CHECK_INTERVAL)
+
+
+_feeds = {}
+_feeds_lock = threading.Lock()
+
+
+def sse_event(digest, payload):
+    data = _json_encoder.encode(payload)
+    return f'id: {digest}\nevent: filaments\ndata: {data}\n\n'.encode('utf-8')
+
+
+def get_filament_feed(slicer_type):
+    with _feeds_lock:
+        feed = _feeds.get(slicer_type)
+        if feed is None:
+            feed = _feeds[slicer_type] = FilamentFeed(slicer_type)
+        return feed
+
+
+# =====================================================
+# Mesh packaging (STL / OBJ → compact 3MF)
+# Optional /open stage (form field convert=3mf): vertices are deduplicated
+# into flat arrays and written as an indexed 3MF mesh, with <basematerials>
+# carrying pre-assigned filament colours (same layout Source D reads back).
+# The readers stay stdlib-only: instead of a vectorised (numpy) parser they
+# loop per vertex in Python, but store into array('f') / array('I') rather
+# than lists of tuples, so a large mesh costs 4 bytes per value.
+# =====================================================
+CONVERTIBLE_EXTENSIONS = {'.stl', '.obj'}
+_STL_VERTEX_RE = re.compile(rb'vertex\s+(\S+)\s+(\S+)\s+(\S+)')
+
+
+def _read_stl(path):
+    """Read ASCII or binary STL → (vertices array('f'), triangles array('I'))."""
+    from array import array
+    with open(path, 'rb') as f:
+        data = f.read()
+    index = {}
+    tris = array('I')
+    is_binary = len(data) >= 84 and len(data) == 84 + 50 * struct.unpack_from('<I', data, 80)[0]
+    if is_binary:
+        # Dedup on the raw 12-byte vertex records: no float conversion needed.
+        mv = memoryview(data)
+        count = struct.unpack_from('<I', data, 80)[0]
+        for t in range(count):
+            off = 84 + 50 * t + 12
+            for v in range(3):
+                key = mv[off + 12 * v:off + 12 * v + 12].tobytes()
+                i = index.get(key)
+                if i is None:
+                    i = index[key] = len(index)
+                tris.append(i)
+        verts = array('f')
+        verts.frombytes(b''.join(index))
+        if sys.byteorder != 'little':
+            verts.byteswap()
+    else:
+        coords = array('f')
+        for m in _STL_VERTEX_RE.finditer(data):
+            key = m.groups()
+            i = index.get(key)
+            if i is None:
+                i = index[key] = len(index)
+                coords.extend(float(c) for c in key)
+            tris.append(i)
+        verts = coords
+    if not tris or len(tris) % 3:
+        raise ValueError("No triangles in STL")
+    return verts, tris
+
+
+def _read_obj(path):
+    """Read Wavefront OBJ (v / f lines, polygons fan-triangulated) → arrays."""
+    from array import array
+    verts = array('f')
+    tris = array('I')
+    with open(path, 'rb') as f:
+        for line in f:
+            # Split on any whitespace: "v\t1 2 3" is as valid as "v 1 2 3"
+            fields = line.split()
+            if not fields:
+                continue
+            if fields[0] == b'v':
+                verts.extend(float(c) for c in fields[1:4])
+            elif fields[0] == b'f':
+                n = len(verts) // 3
+                idx = []
+                for tok in fields[1:]:
+                    i = int(tok.split(b'/')[0])
+                    idx.append(i - 1 if i > 0 else n + i)
+                for j in range(1, len(idx) - 1):
+                    tris.extend((idx[0], idx[j], idx[j + 1]))
+    if not tris:
+        raise ValueError("No faces in OBJ")
+    return verts, tris
+
+
+def write_3mf(path, verts, tris, colors=None, name='Keycap'):
+    """Write an indexed mesh as a minimal 3MF package, streaming the model XML."""
+    import zipfile
+    from xml.sax.saxutils import quoteattr
+    colors = [c for c in (_normalize_hex(c) for c in (colors or [])) if c] or ['#808080']
+    head = ['<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<model unit="millimeter" xml:lang="en-US" '
+            'xmlns="http://schemas.microsoft.com/3dmanufacturing/core/2015/02">\n'
+            ' <resources>\n  <basematerials id="1">\n']
+    for i, c in enumerate(colors):
+        head.append(f'   <base name="Filament {i + 1}" displaycolor="{c}FF"/>\n')
+    head.append(f'  </basematerials>\n  <object id="2" type="model" name={quoteattr(name)} '
+                f'pid="1" pindex="0">\n   <mesh>\n    <vertices>\n')
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as z:
+        z.writestr('[Content_Types].xml',
+                   '<?xml version="1.0" encoding="UTF-8"?>\n'
+                   '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+                   '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+                   '<Default Extension="model" ContentType="application/vnd.ms-package.3dmanufacturing-3dmodel+xml"/>'
+                   '</Types>')
+        z.writestr('_rels/.rels',
+                   '<?xml version="1.0" encoding="UTF-8"?>\n'
+                   '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+                   '<Relationship Target="/3D/3dmodel.model" Id="rel0" '
+                   'Type="http://schemas.microsoft.com/3dmanufacturing/2013/01/3dmodel"/>'
+                   '</Relationships>')
+        with z.open('3D/3dmodel.model', 'w') as out:
+            out.write(''.join(head).encode())
+            step = 3 * 4096
+            for s in range(0, len(verts), step):
+                it = iter(verts[s:s + step])
+                out.write(''.join('     <vertex x="%.7g" y="%.7g" z="%.7g"/>\n' % xyz
+                                  for xyz in zip(it, it, it)).encode())
+            out.write(b'    </vertices>\n    <triangles>\n')
+            for s in range(0, len(tris), step):
+                it = iter(tris[s:s + step])
+                out.write(''.join('     <triangle v1="%d" v2="%d" v3="%d"/>\n' % t
+                                  for t in zip(it, it, it)).encode())
+            out.write(b'    </triangles>\n   </mesh>\n  </object>\n </resources>\n'
+                      b' <build>\n  <item objectid="2"/>\n </build>\n</model>\n')
+    return path
+
+
+def package_mesh_as_3mf(src_path, colors=None):
+    """Convert an .stl/.obj next to itself as .3mf → new path. Raises ValueError."""
+    stem, ext = os.path.splitext(src_path)
+    ext = ext.lower()
+    if ext not in CONVERTIBLE_EXTENSIONS:
+        raise ValueError(f"Cannot convert {ext} to 3MF")
+    verts, tris = _read_stl(src_path) if ext == '.stl' else _read_obj(src_path)
+    return write_3mf(stem + '.3mf', verts, tris, colors, os.path.basename(stem))
+
+
+def prepare_model(file_path, filename, convert='', colors=''):
+    """Optional pre-launch stage → (file_path, filename, converted)."""
+    if str(convert).lower() != '3mf':
+        return file_path, filename, False
+    if os.path.splitext(filename)[1].lower() not in CONVERTIBLE_EXTENSIONS:
+        return file_path, filename, False
+    colour_list = [c for c in re.split(r'[,;\s]+', colors or '') if c]
+    try:
+        new_path = package_mesh_as_3mf(file_path, colour_list)
+    except (ValueError, struct.error, OSError) as e:
+        print(f"[Convert] {filename}: {e}")
+        return file_path, filename, False
+    os.remove(file_path)
+    return new_path, os.path.basename(new_path), True
+
+
+# =====================================================
+# Chunked Uploads (resumable)
+#   POST   /upload               {"filename","size","slicer"} → session
+#   GET    /upload/<id>          → received byte ranges (for resume)
+#   PUT    /upload/<id>?offset=N raw bytes written at offset N
+#   POST   /upload/<id>/commit   → verify complete, open in slicer
+#   DELETE /upload/<id>          → abort
+# =====================================================
+UPLOAD_DIR = os.path.join(TEMP_DIR, "uploads")
+UPLOAD_CHUNK_SIZE = 4 * 1024 * 1024
+UPLOAD_SESSION_TTL = 6 * 60 * 60
+_UPLOAD_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+
+_uploads = {}
+_uploads_lock = threading.Lock()
+
+
+def _merge_range(ranges, start, end):
+    """Add [start, end) to a list of byte ranges, merging overlaps/neighbours."""
+    merged = []
+    for s, e in sorted(ranges + [[start, end]]):
+        if merged and s <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], e)
+        else:
+            merged.append([s, e])
+    return merged
+
+
+def _upload_filename(name):
+    """Client-supplied file name → (basename, error or None)."""
+    filename = os.path.basename(str(name or ''))
+    _, ext = os.path.splitext(filename)
+    if ext.lower() not in ALLOWED_EXTENSIONS:
+        return filename, f"File type not allowed: {ext}"
+    return filename, None
+
+
+def _upload_public(sess):
+    """Client-facing view of an upload session."""
+    return {
+        "upload_id": sess['id'], "filename": sess['filename'],
+        "slicer": sess['slicer'], "size": sess['size'],
+        "chunk_size": UPLOAD_CHUNK_SIZE, "received": sess['received'],
+        "complete": sess['received'] == [[0, sess['size']]] or sess['size'] == 0,
+    }
+
+
+def _save_upload_meta(sess):
+    """Persist session metadata next to the data file so a restart can resume."""
+    meta = {k: sess[k] for k in ('id', 'filename', 'slicer', 'size', 'received', 'created',
+                                 'convert', 'colors')}
+    tmp = sess['path'] + '.json.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(meta, f)
+    os.replace(tmp, sess['path'] + '.json')
+
+
+def _purge_uploads():
+    """Drop sessions (and their files) untouched for UPLOAD_SESSION_TTL."""
+    now = time.time()
+    if not os.path.isdir(UPLOAD_DIR):
+        return
+    for entry in os.scandir(UPLOAD_DIR):
+        try:
+            if now - entry.stat().st_mtime > UPLOAD_SESSION_TTL:
+                os.remove(entry.path)
+                _uploads.pop(entry.name.split('.')[0], None)
+        except OSError:
+            pass
+
+
+def create_upload(filename, size, slicer_type, convert='', colors=''):
+    """Start an upload session and preallocate its data file → session dict."""
+    with _uploads_lock:
+        _purge_uploads()
+        os.makedirs(UPLOAD_DIR, exist_ok=True)
+        uid = os.urandom(16).hex()
+        sess = {
+            'id': uid, 'filename': filename, 'slicer': slicer_type, 'size': size,
+            'received': [], 'created': time.time(),
+            'convert': convert, 'colors': colors,
+            'path': os.path.join(UPLOAD_DIR, uid + '.part'),
+            'lock': threading.Lock(),
+        }
+        with open(sess['path'], 'wb') as f:
+            f.truncate(size)
+        _save_upload_meta(sess)
+        _uploads[uid] = sess
+        return sess
+
+
+def get_upload(uid):
+    """Look up a session, reloading it from disk after a bridge restart."""
+    if not _UPLOAD_ID_RE.match(uid or ''):
+        return None
+    with _uploads_lock:
+        sess = _uploads.get(uid)
+        if sess:
+            return sess
+        path = os.path.join(UPLOAD_DIR, uid + '.part')
+        try:
+            with open(path + '.json', 'r') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not os.path.isfile(path):
+            return None
+        sess = dict({'convert': '', 'colors': ''}, **meta)
+        sess.update(path=path, lock=threading.Lock())
+        _uploads[uid] = sess
+        return sess
+
+
+def write_upload_chunk(sess, offset, length, stream):
+    """Copy `length` bytes from stream straight into the data file at offset.
+    Each call uses its own file handle, so chunks may arrive in parallel."""
+    written = 0
+    with open(sess['path'], 'r+b') as f:
+        f.seek(offset)
+        while written < length:
+            buf = stream.read(min(65536, length - written))
+            if not buf:
+                break
+            f.write(buf)
+            written += len(buf)
+    with sess['lock']:
+        if written:
+            sess['received'] = _merge_range(sess['received'], offset, offset + written)
+            _save_upload_meta(sess)
+    return written
+
+
+def discard_upload(sess):
+    with _uploads_lock:
+        _uploads.pop(sess['id'], None)
+    for path in (sess['path'], sess['path'] + '.json'):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def commit_upload(sess):
+    """Move a fully received upload into TEMP_DIR and open it → (status, payload)."""
+    info = _upload_public(sess)
+    if not info['complete']:
+        return 409, dict(info, error="Upload incomplete")
+    # The session may have been reloaded from its on-disk meta: validate
+    # what it says again, as create_upload's caller did
+    filename, error = _upload_filename(sess['filename'])
+    if error:
+        discard_upload(sess)
+        return 400, {"error": error}
+    slicer_type = str(sess['slicer']).lower()
+    slicer_type = slicer_type if slicer_type in ('bambu', 'orca') else 'bambu'
+    os.makedirs(TEMP_DIR, exist_ok=True)
+    file_path = os.path.join(TEMP_DIR, filename)
+    with sess['lock']:
+        os.replace(sess['path'], file_path)
+    discard_upload(sess)
+    file_path, filename, converted = prepare_model(
+        file_path, filename, sess['convert'], sess['colors'])
+    status, payload = open_in_slicer(slicer_type, file_path, filename)
+    if converted:
+        payload['converted'] = True
+    return status, payload
+
+
+# =====================================================
+# Compressed request bodies (Content-Encoding: gzip / deflate)
+# Bodies are decoded chunk by chunk straight to disk; the size limit
+# applies to the DECODED output so a small zip bomb cannot fill the disk.
+# =====================================================
+MULTIPART_OVERHEAD = 1024 * 1024
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+class _StreamDecoder:
+    """Incremental gzip/deflate/identity decoder with bounded output steps."""
+
+    def __init__(self, encoding):
+        encoding = (encoding or 'identity').strip().lower()
+        self.identity = encoding in ('', 'identity')
+        if self.identity:
+            self._d = None
+        elif encoding in ('gzip', 'x-gzip'):
+            self._d = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif encoding == 'deflate':
+            # RFC says zlib-wrapped, but some clients send raw deflate;
+            # sniff the header on the first chunk.
+            self._d = 'deflate'
+        else:
+            raise ValueError(f"Unsupported Content-Encoding: {encoding}")
+
+    def feed(self, data, step=256 * 1024):
+        """Yield decoded pieces of `data`, never more than `step` bytes at a time."""
+        if self._d is None:
+            yield data
+            return
+        if self._d == 'deflate':
+            zlib_header = len(data) >= 2 and (data[0] & 0x0F) == 8 and ((data[0] << 8) | data[1]) % 31 == 0
+            self._d = zlib.decompressobj(zlib.MAX_WBITS if zlib_header else -zlib.MAX_WBITS)
+        out = self._d.decompress(data, step)
+        while out:
+            yield out
+            out = self._d.decompress(self._d.unconsumed_tail, step) if self._d.unconsumed_tail else b''
+
+    def flush(self):
+        if self._d is None or self._d == 'deflate':
+            return b''
+        return self._d.flush()
+
+
+class DecodingWriter:
+    """Writable that decodes what it is given into dst.
+    Raises UploadTooLarge once decoded output exceeds `limit`."""
+
+    def __init__(self, encoding, dst, limit):
+        self._dec = _StreamDecoder(encoding)
+        self.dst = dst
+        self.limit = limit
+        self.written = 0
+
+    @property
+    def decodes(self):
+        """False for identity: the bytes pass through unchanged."""
+        return not self._dec.identity
+
+    def _emit(self, piece):
+        self.written += len(piece)
+        if self.written > self.limit:
+            raise UploadTooLarge(f"Decoded body exceeds {self.limit} bytes")
+        if piece:
+            self.dst.write(piece)
+
+    def write(self, data):
+        for piece in self._dec.feed(data):
+            self._emit(piece)
+
+    def close(self):
+        """Flush the decoder (dst is left open)."""
+        self._emit(self._dec.flush())
+
+
+def copy_decoded(read, length, encoding, dst, limit):
+    """Copy `length` bytes from read() through the decoder into dst.
+    Raises UploadTooLarge once decoded output exceeds `limit`. Returns bytes written."""
+    out = DecodingWriter(encoding, dst, limit)
+    remaining = length
+    while remaining > 0:
+        buf = read(min(65536, remaining))
+        if not buf:
+            break
+        remaining -= len(buf)
+        out.write(buf)
+    out.close()
+    return out.written
+
+
+class MultipartWriter:
+    """Incremental multipart/form-data parser with a file-like write().
+    open_part(header_text) is called when a part's headers are complete and
+    returns the writable that receives the part's body (its close() is
+    called when the part ends). Only a delimiter's length is held back
+    between writes, so a part streams straight into its sink."""
+
+    HEADER_LIMIT = 16 * 1024
+
+    def __init__(self, boundary, open_part):
+        self._delim = b'\r\n--' + boundary.encode('latin-1')
+        self._open_part = open_part
+        self._buf = b'\r\n'    # the first delimiter then matches like the others
+        self._state = 'preamble'
+        self._sink = None
+
+    def _end_part(self):
+        sink, self._sink = self._sink, None
+        if hasattr(sink, 'close'):
+            sink.close()
+
+    def write(self, data):
+        buf = self._buf + data
+        delim = self._delim
+        while True:
+            if self._state in ('preamble', 'body'):
+                idx = buf.find(delim)
+                if idx < 0:
+                    keep = len(delim) - 1
+                    if self._state == 'body' and len(buf) > keep:
+                        self._sink.write(buf[:-keep])
+                    buf = buf[-keep:]
+                    break
+                if self._state == 'body':
+                    if idx:
+                        self._sink.write(buf[:idx])
+                    self._end_part()
+                buf = buf[idx + len(delim):]
+                self._state = 'delimiter'
+            elif self._state == 'delimiter':
+                if len(buf) < 2:
+                    break
+                self._state = 'done' if buf[:2] == b'--' else 'headers'
+            elif self._state == 'headers':
+                end = buf.find(b'\r\n\r\n')
+                if end < 0:
+                    if len(buf) > self.HEADER_LIMIT:
+                        raise ValueError("Multipart part headers too large")
+                    break
+                header_text = buf[:end].decode('utf-8', errors='replace').strip()
+                buf = buf[end + 4:]
+                self._sink = self._open_part(header_text)
+                self._state = 'body'
+            else:
+                # Closing delimiter seen: the epilogue is ignored
+                buf = b''
+                break
+        self._buf = buf
+
+    def close(self):
+        """End of input. A part without a closing delimiter keeps what it got."""
+        if self._state == 'body':
+            if self._buf:
+                self._sink.write(self._buf)
+            self._end_part()
+        self._buf = b''
+        self._state = 'done'
+
+
+class UploadRejected(ValueError):
+    """An /open part was refused: args are (status, payload)."""
+
+
+class _FieldSink:
+    def __init__(self, fields, name, limit):
+        self.fields = fields
+        self.name = name
+        self.limit = limit
+        self.buf = io.BytesIO()
+
+    def write(self, data):
+        if self.buf.tell() + len(data) > self.limit:
+            raise UploadRejected(400, {"error": f"Field too large: {self.name}"})
+        self.buf.write(data)
+
+    def close(self):
+        self.fields[self.name] = self.buf.getvalue().decode('utf-8', errors='replace').strip()
+
+
+class _DiscardSink:
+    def write(self, data):
+        pass
+
+
+class OpenForm:
+    """Part sinks for an /open body: text fields are kept in memory and the
+    file part is decoded (per-part Content-Encoding or a .gz name) straight
+    into TEMP_DIR."""
+
+    FIELDS = ('slicer', 'convert', 'colors')
+    FIELD_LIMIT = 64 * 1024
+
+    def __init__(self):
+        self.fields = {}
+        self.filename = None
+        self.file_path = None
+        self._file = None
+        self._writer = None
+
+    def open_part(self, header_text):
+        if 'Content-Disposition' not in header_text:
+            return _DiscardSink()
+        name_match = re.search(r'name="([^"]*)"', header_text)
+        if not name_match:
+            return _DiscardSink()
+        field_name = name_match.group(1)
+        if field_name == 'file':
+            return self._open_file(header_text)
+        if field_name in self.FIELDS:
+            return _FieldSink(self.fields, field_name, self.FIELD_LIMIT)
+        return _DiscardSink()
+
+    def _open_file(self, header_text):
+        self.discard()
+        filename = 'model.3mf'
+        fn_match = re.search(r'filename="([^"]*)"', header_text)
+        if fn_match and fn_match.group(1):
+            filename = os.path.basename(fn_match.group(1))
+        enc_match = re.search(r'(?im)^content-encoding:\s*([\w-]+)', header_text)
+        part_encoding = enc_match.group(1) if enc_match else ''
+        if not part_encoding and filename.lower().endswith('.gz'):
+            part_encoding = 'gzip'
+        try:
+            writer = DecodingWriter(part_encoding, None, MAX_UPLOAD_BYTES)
+        except ValueError as e:
+            raise UploadRejected(415, {"error": str(e)})
+        # Only a name whose content is actually decompressed loses its .gz
+        if writer.decodes and filename.lower().endswith('.gz'):
+            filename = filename[:-3]
+        _, ext = os.path.splitext(filename)
+        if ext.lower() not in ALLOWED_EXTENSIONS:
+            raise UploadRejected(400, {"error": f"File type not allowed: {ext}"})
+        self.filename = filename
+        self.file_path = os.path.join(TEMP_DIR, filename)
+        self._file = writer.dst = open(self.file_path, 'wb')
+        self._writer = writer
+        return self
+
+    def write(self, data):
+        self._writer.write(data)
+
+    def close(self):
+        """End of the file part: flush the decoder and close the file."""
+        try:
+            self._writer.close()
+        finally:
+            self._file.close()
+
+    def discard(self):
+        """Drop a partially or fully written file part."""
+        if self._file is not None:
+            self._file.close()
+            try:
+                os.remove(self.file_path)
+            except OSError:
+                pass
+        self._file = self._writer = self.filename = self.file_path = None
+
+
 # =====================================================
 # HTTP Server
+# HTTP/1.1 persistent connections: every response carries a length (or
+# closes the connection), idle connections time out, and a connection is
+# retired after KEEPALIVE_MAX_REQUESTS so one tab cannot pin a thread.
 # =====================================================
+KEEPALIVE_TIMEOUT = 15.0
+KEEPALIVE_MAX_REQUESTS = 100
+BODY_DRAIN_LIMIT = 64 * 1024
+
+
+class _BodyReader:
+    """rfile view limited to one request's Content-Length, so leftover
+    bytes of an unread body can be drained instead of parsed as a request."""
+
+    def __init__(self, raw, length):
+        self.raw = raw
+        self.remaining = length
+
+    def read(self, n=-1):
+        if n is None or n < 0 or n > self.remaining:
+            n = self.remaining
+        if n <= 0:
+            return b''
+        data = self.raw.read(n)
+        self.remaining -= len(data)
+        if not data:
+            self.remaining = 0
+        return data
+
+    def drain(self, limit):
+        """Discard what is left; False if more than `limit` bytes remain."""
+        if self.remaining > limit:
+            return False
+        while self.remaining > 0:
+            if not self.read(min(self.remaining, 64 * 1024)):
+                break
+        return True
+
+
 class BridgeHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    timeout = KEEPALIVE_TIMEOUT
+
     def log_message(self, format, *args):
         pass
 
-    def _set_cors_headers(self):
-        origin = self.headers.get('Origin', '')
-        if is_origin_allowed(origin):
-            self.send_header('Access-Control-Allow-Origin', origin if origin else '*')
+    def setup(self):
+        super().setup()
+        self._raw_rfile = self.rfile
+        self._served = 0
+        self._body = None
+
+    def finish(self):
+        self.rfile = self._raw_rfile
+        super().finish()
+
+    def handle_one_request(self):
+        self.rfile = self._raw_rfile
+        self._body = None
+        super().handle_one_request()
+        if self._body is not None and not self._body.drain(BODY_DRAIN_LIMIT):
+            self.close_connection = True
+
+    def parse_request(self):
+        if not super().parse_request():
+            return False
+        self._served += 1
+        if self.headers.get('Transfer-Encoding'):
+            # No chunked request bodies here; answer and drop the connection
+            self.close_connection = True
+            length = 0
         else:
-            self.send_header('Access-Control-Allow-Origin', 'null')
-        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
-        self.send_header('Access-Control-Max-Age', '86400')
+            try:
+                length = max(0, int(self.headers.get('Content-Length', 0)))
+            except ValueError:
+                self.send_error(400, "Bad Content-Length")
+                return False
+        self._body = _BodyReader(self._raw_rfile, length)
+        self.rfile = self._body
+        return True
+
+    def end_headers(self):
+        if self.close_connection or self._served >= KEEPALIVE_MAX_REQUESTS or (
+                self._body is not None and self._body.remaining > BODY_DRAIN_LIMIT):
+            # Last response on this connection: an unread large body would
+            # otherwise be parsed as the next request line
+            self.send_header('Connection', 'close')
+        else:
+            self.send_header('Keep-Alive', f'timeout={int(KEEPALIVE_TIMEOUT)}, '
+                                           f'max={KEEPALIVE_MAX_REQUESTS - self._served}')
+        super().end_headers()
 
-    def _send_json(self, status, data):
+    def _set_cors_headers(self):
+        for name, value in cors_headers(self.headers.get('Origin', '')):
+            self.send_header(name, value)
+
+    def _send_json(self, status, data, etag=False):
+        """etag=True: strong validator over the exact bytes we would send;
+        a string is used as the ETag as-is."""
+        body = _json_encoder.encode(data).encode('utf-8')
+        tag = etag if isinstance(etag, str) else None
+        if etag is True:
+            tag = '"' + hashlib.sha1(body).hexdigest()[:32] + '"'
+        self._send_body(status, body, 'application/json; charset=utf-8', tag)
+
+    def _send_body(self, status, body, content_type, tag=None):
+        """Send a complete body; with a tag, answer a matching If-None-Match with 304."""
+        if tag and self._etag_matches(tag):
+            self.send_response(304)
+            self.send_header('ETag', tag)
+            self.send_header('Cache-Control', 'no-cache')
+            self._set_cors_headers()
+            self.end_headers()
+            return
         self.send_response(status)
-        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if tag:
+            self.send_header('ETag', tag)
+            self.send_header('Cache-Control', 'no-cache')
         self._set_cors_headers()
         self.end_headers()
-        self.wfile.write(json.dumps(data, ensure_ascii=False).encode('utf-8'))
+        self.wfile.write(body)
+
+    def _etag_matches(self, tag):
+        inm = self.headers.get('If-None-Match', '')
+        if not inm:
+            return False
+        if inm.strip() == '*':
+            return True
+        # Weak comparison (RFC 7232 §3.2): W/ prefixes are ignored
+        opaque = lambda t: t[2:] if t.startswith('W/') else t
+        return any(opaque(t.strip()) == opaque(tag) for t in inm.split(','))
 
     def do_OPTIONS(self):
+        # No Content-Length: a 204 has no body by definition (RFC 7230 §3.3.2)
         self.send_response(204)
         self._set_cors_headers()
         self.end_headers()
 
     def do_GET(self):
-        if self.path == '/health':
+        if self.path.split('?')[0] == '/health':
             bambu = find_slicer("bambu")
             orca = find_slicer("orca")
             self._send_json(200, {
@@ -1588,40 +4203,363 @@ class BridgeHandler(BaseHTTPRequestHandler):
                     "bambu": {"available": bambu is not None, "path": bambu or ""},
                     "orca": {"available": orca is not None, "path": orca or ""},
                 },
-                "features": ["project-filaments"]
-            })
+                "features": ["project-filaments", "project-filaments-stream", "chunked-upload",
+                             "color-match", "filament-presets", "project-thumbnail"]
+            }, etag=True)
+        elif self.path.startswith('/project-filaments/stream'):
+            self._stream_filaments()
         elif self.path.startswith('/project-filaments'):
             slicer = 'bambu'
+            want_debug = True
+            mode = 'sequential'
+            budget_ms = None
+            plate = None
+            want_usage = False
             if '?' in self.path:
                 from urllib.parse import parse_qs, urlparse
                 qs = parse_qs(urlparse(self.path).query)
                 slicer = qs.get('slicer', ['bambu'])[0]
+                want_debug = qs.get('debug', ['1'])[0] not in ('0', 'false', 'no')
+                mode = qs.get('mode', [mode])[0]
+                try:
+                    budget_ms = int(qs['budget_ms'][0]) if 'budget_ms' in qs else None
+                except ValueError:
+                    self._send_json(400, {"error": "budget_ms must be an integer"})
+                    return
+                try:
+                    plate = int(qs['plate'][0]) if 'plate' in qs else None
+                except ValueError:
+                    self._send_json(400, {"error": "plate must be an integer"})
+                    return
+                want_usage = qs.get('usage', ['0'])[0] in ('1', 'true', 'yes')
             try:
-                result = get_project_filaments(slicer)
-                self._send_json(200, result)
+                if slicer == 'all':
+                    result = scan_all_project_filaments(mode, budget_ms)
+                    if plate is not None:
+                        result = dict(result, results={
+                            k: _select_plate(v, plate, k) for k, v in result['results'].items()})
+                    if want_usage:
+                        result = dict(result, results={
+                            k: dict(v, usage=project_paint_usage(v, k))
+                            for k, v in result['results'].items()})
+                    if not want_debug:
+                        for sub in result['results'].values():
+                            sub.pop('debug', None)
+                else:
+                    result = scan_project_filaments(slicer, mode, budget_ms)
+                    if plate is not None:
+                        result = _select_plate(result, plate, slicer)
+                    if want_usage:
+                        result = dict(result, usage=project_paint_usage(result, slicer))
+                if not want_debug:
+                    result.pop('debug', None)
+                self._send_json(200, result, etag=filament_result_etag(result))
             except Exception as e:
                 import traceback
                 self._send_json(500, {"error": str(e), "tb": traceback.format_exc()})
         elif self.path.startswith('/debug'):
-            slicer = 'bambu'
-            if '?' in self.path:
-                from urllib.parse import parse_qs, urlparse
-                qs = parse_qs(urlparse(self.path).query)
-                slicer = qs.get('slicer', ['bambu'])[0]
-            try:
-                result = debug_slicer_conf(slicer)
+            self._handle_debug()
+        elif self.path.startswith('/color-match'):
+            self._handle_color_match()
+        elif self.path.startswith('/filament-presets'):
+            self._handle_filament_presets()
+        elif self.path.startswith('/project-thumbnail'):
+            self._handle_project_thumbnail()
+        elif self.path.startswith('/upload/'):
+            sess = get_upload(self.path.split('?')[0][len('/upload/'):])
+            if not sess:
+                self._send_json(404, {"error": "Unknown upload"})
+                return
+            self._send_json(200, _upload_public(sess))
+        else:
+            self._send_json(404, {"error": "Not found"})
+
+    def _handle_color_match(self):
+        from urllib.parse import parse_qs, urlparse
+        qs = parse_qs(urlparse(self.path).query)
+        slicer = qs.get('slicer', ['bambu'])[0]
+        slicer = slicer if slicer in ('bambu', 'orca') else 'bambu'
+        colours = [c for c in ','.join(qs.get('colors', [])).split(',') if c.strip()]
+        if not colours:
+            self._send_json(400, {"error": "colors is required (e.g. colors=FF0000,00AEEF)"})
+            return
+        try:
+            k = min(max(1, int(qs.get('k', [COLOR_MATCH_K])[0])), COLOR_MATCH_MAX_K)
+        except ValueError:
+            self._send_json(400, {"error": "k must be an integer"})
+            return
+        try:
+            index = preset_color_index(slicer)
+            self._send_json(200, {"status": "ok", "presets": len(index),
+                                  "matches": match_colors(slicer, colours, k)}, etag=True)
+        except Exception as e:
+            self._send_json(500, {"error": "Internal error", "detail": str(e)})
+
+    def _handle_filament_presets(self):
+        from urllib.parse import parse_qs, urlparse
+        qs = parse_qs(urlparse(self.path).query)
+        slicer = qs.get('slicer', ['bambu'])[0]
+        slicer = slicer if slicer in ('bambu', 'orca') else 'bambu'
+        match = qs.get('match', ['prefix'])[0]
+        if match not in ('prefix', 'substring'):
+            self._send_json(400, {"error": "match must be prefix or substring"})
+            return
+        try:
+            limit = min(max(1, int(qs.get('limit', [FILAMENT_PRESETS_LIMIT])[0])),
+                        FILAMENT_PRESETS_MAX_LIMIT)
+            offset = max(0, int(qs.get('offset', ['0'])[0]))
+        except ValueError:
+            self._send_json(400, {"error": "limit/offset must be integers"})
+            return
+        try:
+            catalog = preset_catalog(slicer)
+            total, rows = catalog.search(qs.get('q', [''])[0], match,
+                                         qs.get('vendor', [''])[0], qs.get('type', [''])[0],
+                                         limit, offset)
+            self._send_json(200, {
+                "status": "ok", "presets": len(catalog), "total": total,
+                "offset": offset, "limit": limit,
+                "next_offset": offset + limit if offset + limit < total else None,
+                "results": [{"name": r[0], "color": r[1], "type": r[2], "vendor": r[3]}
+                            for r in rows],
+            }, etag=True)
+        except Exception as e:
+            self._send_json(500, {"error": "Internal error", "detail": str(e)})
+
+    def _handle_project_thumbnail(self):
+        from urllib.parse import parse_qs, urlparse
+        qs = parse_qs(urlparse(self.path).query)
+        slicer = qs.get('slicer', ['bambu'])[0]
+        slicer = slicer if slicer in ('bambu', 'orca') else 'bambu'
+        try:
+            plate = max(1, int(qs.get('plate', ['1'])[0]))
+            size = int(qs['size'][0]) if 'size' in qs else None
+        except ValueError:
+            self._send_json(400, {"error": "plate/size must be integers"})
+            return
+        if size is not None:
+            size = min(max(size, THUMBNAIL_MIN_SIZE), THUMBNAIL_MAX_SIZE)
+        source = qs.get('source', [''])[0]
+        try:
+            if source:
+                # Only .3mf files the scanner would consider may be read. The
+                # conf is read as the scanner does, so the shared candidate
+                # cache keeps its recent projects.
+                path = _project_source({'source': source})[0] if source.startswith('3mf:') else source
+                tokens, _, _ = _read_conf_tokens(slicer, ScanIO())
+                conf_data = tokens['json'] if tokens else None
+                candidates = {os.path.normcase(os.path.abspath(p))
+                              for _, p in _collect_3mf_files(slicer, conf_data)}
+                if not path or os.path.normcase(os.path.abspath(path)) not in candidates:
+                    self._send_json(403, {"error": "source is not a known project .3mf"})
+                    return
+                found = (path, None)
+            else:
+                # Default: the project the last scan matched
+                with _state_lock:
+                    last = _last_results.get(slicer)
+                found = _project_source(last['result'], slicer) if last else None
+                if not found:
+                    self._send_json(404, {"error": "No project matched yet; pass source"})
+                    return
+            plates = project_thumbnail_plates(found[0], found[1])
+            thumb = project_thumbnail(found[0], found[1], plate, size) if plate in plates else None
+        except Exception as e:
+            self._send_json(500, {"error": "Internal error", "detail": str(e)})
+            return
+        if thumb is None:
+            self._send_json(404, {"error": f"No thumbnail for plate {plate}",
+                                  "plates": sorted(plates)})
+            return
+        self._send_body(200, thumb[0], 'image/png', thumb[1])
+
+    def _handle_debug(self):
+        from urllib.parse import parse_qs, urlparse
+        qs = parse_qs(urlparse(self.path).query)
+        slicer = qs.get('slicer', ['bambu'])[0]
+        sections = [x for x in ','.join(qs.get('sections', [])).split(',') if x]
+        unknown = [x for x in sections if x not in DEBUG_SECTIONS + ('scan_coalescing',)]
+        try:
+            limit = max(0, int(qs.get('limit', [DEBUG_TEMP_LIMIT])[0]))
+            offset = max(0, int(qs.get('offset', ['0'])[0]))
+        except ValueError:
+            unknown = unknown or ['limit/offset must be integers']
+        if unknown:
+            self._send_json(400, {"error": f"Bad debug query: {', '.join(unknown)}",
+                                  "sections": list(DEBUG_SECTIONS) + ['scan_coalescing']})
+            return
+        with_coalescing = not sections or 'scan_coalescing' in sections
+        parts = iter_debug_sections(slicer, sections, limit, offset)
+        try:
+            if qs.get('format', [''])[0] != 'ndjson':
+                result = {}
+                for _, part in parts:
+                    result.update(part)
+                if with_coalescing:
+                    result['scan_coalescing'] = _filament_scans.stats
                 self._send_json(200, result)
-            except Exception as e:
-                import traceback
-                self._send_json(500, {"error": str(e), "tb": traceback.format_exc()})
+                return
+        except Exception as e:
+            import traceback
+            self._send_json(500, {"error": str(e), "tb": traceback.format_exc()})
+            return
+
+        # NDJSON: one {"section", "data"} line per section, sent as computed
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson; charset=utf-8')
+        self.send_header('Cache-Control', 'no-cache')
+        chunked = self.request_version == 'HTTP/1.1'
+        if chunked:
+            self.send_header('Transfer-Encoding', 'chunked')
         else:
+            self.close_connection = True
+        self._set_cors_headers()
+        self.end_headers()
+
+        def emit(line):
+            data = (_json_encoder.encode(line) + '\n').encode('utf-8')
+            if chunked:
+                data = b'%x\r\n%s\r\n' % (len(data), data)
+            self.wfile.write(data)
+            self.wfile.flush()
+
+        try:
+            for name, part in parts:
+                emit({'section': name, 'data': part})
+            if with_coalescing:
+                emit({'section': 'scan_coalescing', 'data': _filament_scans.stats})
+        except Exception as e:
+            emit({'section': 'error', 'data': {'error': str(e)}})
+        if chunked:
+            self.wfile.write(b'0\r\n\r\n')
+
+    def _stream_filaments(self):
+        """SSE: push the filament result whenever its content hash changes."""
+        from urllib.parse import parse_qs, urlparse
+        qs = parse_qs(urlparse(self.path).query)
+        slicer = qs.get('slicer', ['bambu'])[0]
+        slicer = slicer if slicer in ('bambu', 'orca') else 'bambu'
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream; charset=utf-8')
+        self.send_header('Cache-Control', 'no-cache')
+        # Unbounded body: the stream ends when the connection does
+        self.close_connection = True
+        self._set_cors_headers()
+        self.end_headers()
+
+        events = queue.Queue()
+        last_sent = self.headers.get('Last-Event-ID', '')
+        unsubscribe = get_filament_feed(slicer).subscribe(
+            lambda digest, payload: events.put((digest, payload)))
+        try:
+            while True:
+                try:
+                    digest, payload = events.get(timeout=FEED_HEARTBEAT)
+                except queue.Empty:
+                    self.wfile.write(b': keepalive\n\n')
+                    self.wfile.flush()
+                    continue
+                if digest == last_sent:
+                    continue
+                last_sent = digest
+                self.wfile.write(sse_event(digest, payload))
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError, ConnectionAbortedError, OSError):
+            pass
+        finally:
+            unsubscribe()
+
+    def _read_json_body(self, limit=64 * 1024):
+        length = int(self.headers.get('Content-Length', 0))
+        if length > limit:
+            raise ValueError("Request body too large")
+        data = json.loads(self.rfile.read(length).decode('utf-8') or '{}')
+        if not isinstance(data, dict):
+            raise ValueError("Expected a JSON object")
+        return data
+
+    def _handle_upload_create(self):
+        try:
+            req = self._read_json_body()
+            filename, error = _upload_filename(req.get('filename', ''))
+            size = int(req.get('size', -1))
+        except (ValueError, TypeError) as e:
+            self._send_json(400, {"error": f"Bad upload request: {e}"})
+            return
+        if error:
+            self._send_json(400, {"error": error})
+            return
+        if size < 0 or size > MAX_UPLOAD_BYTES:
+            self._send_json(400, {"error": "File too large (max 100MB)"})
+            return
+        slicer_type = str(req.get('slicer', 'bambu')).lower()
+        slicer_type = slicer_type if slicer_type in ('bambu', 'orca') else 'bambu'
+        sess = create_upload(filename, size, slicer_type,
+                             str(req.get('convert', '')), str(req.get('colors', '')))
+        self._send_json(201, _upload_public(sess))
+
+    def do_PUT(self):
+        origin = self.headers.get('Origin', '')
+        if not is_origin_allowed(origin):
+            self._send_json(403, {"error": "Origin not allowed"})
+            return
+        from urllib.parse import parse_qs, urlparse
+        url = urlparse(self.path)
+        if not url.path.startswith('/upload/'):
             self._send_json(404, {"error": "Not found"})
+            return
+        sess = get_upload(url.path[len('/upload/'):])
+        if not sess:
+            self._send_json(404, {"error": "Unknown upload"})
+            return
+        try:
+            offset = int(parse_qs(url.query).get('offset', ['0'])[0])
+            length = int(self.headers.get('Content-Length', 0))
+        except ValueError:
+            self._send_json(400, {"error": "Bad offset or Content-Length"})
+            return
+        if offset < 0 or length < 0 or offset + length > sess['size']:
+            self._send_json(416, dict(_upload_public(sess), error="Chunk outside file"))
+            return
+        try:
+            write_upload_chunk(sess, offset, length, self.rfile)
+        except OSError as e:
+            self._send_json(500, {"error": "Internal error", "detail": str(e)})
+            return
+        self._send_json(200, _upload_public(sess))
+
+    def do_DELETE(self):
+        origin = self.headers.get('Origin', '')
+        if not is_origin_allowed(origin):
+            self._send_json(403, {"error": "Origin not allowed"})
+            return
+        sess = None
+        if self.path.startswith('/upload/'):
+            sess = get_upload(self.path.split('?')[0][len('/upload/'):])
+        if not sess:
+            self._send_json(404, {"error": "Unknown upload"})
+            return
+        discard_upload(sess)
+        self._send_json(200, {"success": True, "upload_id": sess['id']})
 
     def do_POST(self):
         origin = self.headers.get('Origin', '')
         if not is_origin_allowed(origin):
             self._send_json(403, {"error": "Origin not allowed"})
             return
+        if self.path == '/upload':
+            self._handle_upload_create()
+            return
+        if self.path.startswith('/upload/') and self.path.endswith('/commit'):
+            sess = get_upload(self.path[len('/upload/'):-len('/commit')])
+            if not sess:
+                self._send_json(404, {"error": "Unknown upload"})
+                return
+            try:
+                self._send_json(*commit_upload(sess))
+            except Exception as e:
+                self._send_json(500, {"error": "Internal error", "detail": str(e)})
+            return
         if self.path != '/open':
             self._send_json(404, {"error": "Not found"})
             return
@@ -1631,9 +4569,6 @@ class BridgeHandler(BaseHTTPRequestHandler):
                 self._send_json(400, {"error": "Expected multipart/form-data"})
                 return
 
-            content_length = int(self.headers.get('Content-Length', 0))
-            body = self.rfile.read(content_length)
-
             # Parse multipart boundary
             boundary = None
             for part in content_type.split(';'):
@@ -1645,89 +4580,307 @@ class BridgeHandler(BaseHTTPRequestHandler):
                 self._send_json(400, {"error": "No boundary in multipart"})
                 return
 
-            # Parse multipart fields
-            slicer_type = 'bambu'
-            file_data = None
-            filename = 'model.3mf'
-            boundary_bytes = ('--' + boundary).encode()
-            parts = body.split(boundary_bytes)
-            for part in parts:
-                if b'Content-Disposition' not in part:
-                    continue
-                header_end = part.find(b'\r\n\r\n')
-                if header_end < 0:
-                    continue
-                header_section = part[:header_end].decode('utf-8', errors='replace')
-                part_body = part[header_end + 4:]
-                if part_body.endswith(b'\r\n'):
-                    part_body = part_body[:-2]
-
-                # Extract field name
-                name_match = re.search(r'name="([^"]*)"', header_section)
-                if not name_match:
-                    continue
-                field_name = name_match.group(1)
-
-                if field_name == 'slicer':
-                    slicer_type = part_body.decode('utf-8', errors='replace').strip().lower()
-                elif field_name == 'file':
-                    file_data = part_body
-                    fn_match = re.search(r'filename="([^"]*)"', header_section)
-                    if fn_match and fn_match.group(1):
-                        filename = os.path.basename(fn_match.group(1))
-
-            slicer_type = slicer_type if slicer_type in ('bambu', 'orca') else 'bambu'
-
-            slicer_path = find_slicer(slicer_type)
-            if not slicer_path:
-                name = "Bambu Studio" if slicer_type == "bambu" else "OrcaSlicer"
-                self._send_json(404, {"error": f"{name} not found",
-                                       "message": f"{name}が見つかりません。"})
+            content_length = int(self.headers.get('Content-Length', 0))
+            if content_length > MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD:
+                self._send_json(413, {"error": "File too large (max 100MB)"})
                 return
 
-            if file_data is None:
-                self._send_json(400, {"error": "No file provided"})
+            os.makedirs(TEMP_DIR, exist_ok=True)
+            # Request-level decoding feeds the multipart parser, which feeds
+            # the file part (decoded again if it is encoded itself) straight
+            # into its destination: nothing is spooled in between
+            form = OpenForm()
+            parser = MultipartWriter(boundary, form.open_part)
+            try:
+                copy_decoded(self.rfile.read, content_length,
+                             self.headers.get('Content-Encoding', ''), parser,
+                             MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD)
+                parser.close()
+            except UploadTooLarge:
+                form.discard()
+                self._send_json(413, {"error": "File too large (max 100MB)"})
                 return
-
-            _, ext = os.path.splitext(filename)
-            if ext.lower() not in ALLOWED_EXTENSIONS:
-                self._send_json(400, {"error": f"File type not allowed: {ext}"})
+            except UploadRejected as e:
+                form.discard()
+                self._send_json(*e.args)
                 return
+            except (ValueError, zlib.error) as e:
+                form.discard()
+                self._send_json(415, {"error": str(e)})
+                return
+            except BaseException:
+                form.discard()
+                raise
+            self._open_multipart(form)
+        except Exception as e:
+            self._send_json(500, {"error": "Internal error", "detail": str(e)})
+
+    def _open_multipart(self, form):
+        """Handle /open once its multipart body has been written out."""
+        slicer_type = form.fields.get('slicer', 'bambu').lower()
+        slicer_type = slicer_type if slicer_type in ('bambu', 'orca') else 'bambu'
+
+        slicer_path = find_slicer(slicer_type)
+        if not slicer_path:
+            form.discard()
+            name = "Bambu Studio" if slicer_type == "bambu" else "OrcaSlicer"
+            self._send_json(404, {"error": f"{name} not found",
+                                   "message": f"{name}が見つかりません。"})
+            return
+
+        if form.file_path is None:
+            self._send_json(400, {"error": "No file provided"})
+            return
 
-            if len(file_data) > 100 * 1024 * 1024:
-                self._send_json(400, {"error": "File too large (max 100MB)"})
+        file_path, filename, converted = prepare_model(
+            form.file_path, form.filename, form.fields.get('convert', ''),
+            form.fields.get('colors', ''))
+        status, payload = open_in_slicer(slicer_type, file_path, filename)
+        if converted:
+            payload['converted'] = True
+        self._send_json(status, payload)
+
+
+def start_server():
+    """Bind the listener synchronously and serve it on a daemon thread.
+    Returns the server, or None if the port could not be bound."""
+    try:
+        server = ThreadingHTTPServer(('127.0.0.1', PORT), BridgeHandler)
+    except OSError as e:
+        print(f"[{APP_NAME}] Cannot listen on port {PORT}: {e}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# =====================================================
+# asyncio engine (--engine=asyncio)
+# The event loop owns every socket, so idle keep-alive and SSE clients cost
+# a coroutine instead of a thread. Request heads are parsed on the loop and
+# bodies spooled with backpressure; BridgeHandler then runs unchanged in an
+# executor against the spooled request, so both engines share every route.
+# =====================================================
+SPOOL_MEMORY_BYTES = 1024 * 1024
+ENGINE_WORKERS = 16
+
+
+class _LoopWriter:
+    """wfile for a handler running off the loop: each write is handed to the
+    loop and waits for the transport to drain."""
+
+    def __init__(self, loop, writer):
+        self._loop = loop
+        self._writer = writer
+
+    async def _write(self, data):
+        self._writer.write(data)
+        await self._writer.drain()
+
+    def write(self, data):
+        import asyncio
+        asyncio.run_coroutine_threadsafe(self._write(bytes(data)), self._loop).result()
+        return len(data)
+
+    def flush(self):
+        pass
+
+
+class AsyncBridgeServer:
+    """Stdlib asyncio HTTP/1.1 front end for BridgeHandler."""
+
+    def __init__(self, address=('127.0.0.1', PORT)):
+        self.server_address = address
+        self.loop = None
+        self._server = None
+        self._pool = None
+
+    def start(self):
+        """Bind on a dedicated loop thread; raises OSError if the port is taken."""
+        import asyncio
+        from concurrent.futures import ThreadPoolExecutor
+        self._pool = ThreadPoolExecutor(max_workers=ENGINE_WORKERS, thread_name_prefix='ksb-http')
+        ready = threading.Event()
+        failed = []
+
+        def run():
+            loop = self.loop = asyncio.new_event_loop()
+            try:
+                self._server = loop.run_until_complete(
+                    asyncio.start_server(self._serve_connection, *self.server_address))
+            except OSError as e:
+                failed.append(e)
+                loop.close()
+                ready.set()
                 return
+            self.server_address = self._server.sockets[0].getsockname()[:2]
+            ready.set()
+            loop.run_forever()
+
+        threading.Thread(target=run, daemon=True).start()
+        ready.wait()
+        if failed:
+            raise failed[0]
+        return self
+
+    def shutdown(self):
+        """Close the listener and any idle keep-alive connections, then stop."""
+        import asyncio
+
+        async def stop():
+            self._server.close()
+            tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
 
-            os.makedirs(TEMP_DIR, exist_ok=True)
-            file_path = os.path.join(TEMP_DIR, filename)
+        try:
+            asyncio.run_coroutine_threadsafe(stop(), self.loop).result(timeout=5)
+        except Exception:
+            pass
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._pool.shutdown(wait=False)
 
-            with open(file_path, 'wb') as f:
-                f.write(file_data)
+    async def _serve_connection(self, reader, writer):
+        import asyncio
+        import http.client
+        served = 0
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), KEEPALIVE_TIMEOUT)
+                except asyncio.LimitOverrunError:
+                    writer.write(b'HTTP/1.1 431 Request Header Fields Too Large\r\n'
+                                 b'Content-Length: 0\r\nConnection: close\r\n\r\n')
+                    break
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError):
+                    break
+                request_line, _, header_block = head.partition(b'\r\n')
+                try:
+                    headers = http.client.parse_headers(io.BytesIO(header_block))
+                except http.client.HTTPException:
+                    break
+                words = request_line.split()
+                if len(words) == 3 and words[0] == b'GET' and \
+                        words[1].startswith(b'/project-filaments/stream'):
+                    await self._stream_filaments(writer, words[1].decode('latin-1'), headers)
+                    break
 
-            subprocess.Popen([slicer_path, file_path])
-            name = "Bambu Studio" if slicer_type == "bambu" else "OrcaSlicer"
-            self._send_json(200, {
-                "success": True,
-                "message": f"{name}でモデルを開きました",
-                "slicer": name, "file": filename
-            })
-        except Exception as e:
-            self._send_json(500, {"error": "Internal error", "detail": str(e)})
+                # Same framing rules as BridgeHandler.parse_request: bodies the
+                # handler would refuse unread are not spooled at all
+                try:
+                    length = max(0, int(headers.get('Content-Length', 0)))
+                except ValueError:
+                    length = 0
+                if headers.get('Transfer-Encoding') or \
+                        length > MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD:
+                    length = 0
+                if length and headers.get('Expect', '').lower() == '100-continue':
+                    writer.write(b'HTTP/1.1 100 Continue\r\n\r\n')
+
+                spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY_BYTES, dir=TEMP_DIR)
+                try:
+                    spool.write(head)
+                    if not await self._spool_body(reader, spool, length):
+                        break
+                    spool.seek(0)
+                    keep, served = await asyncio.get_running_loop().run_in_executor(
+                        self._pool, self._handle, spool, writer, served,
+                        writer.get_extra_info('peername'))
+                finally:
+                    spool.close()
+                if not keep:
+                    break
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _spool_body(self, reader, spool, length):
+        """Copy `length` body bytes into the spool. The reader pauses the
+        socket while its buffer is full, so a slow disk throttles the client."""
+        import asyncio
+        loop = asyncio.get_running_loop()
+        to_disk = length > SPOOL_MEMORY_BYTES
+        while length > 0:
+            chunk = await asyncio.wait_for(reader.read(min(length, 256 * 1024)), KEEPALIVE_TIMEOUT)
+            if not chunk:
+                return False
+            length -= len(chunk)
+            if to_disk:
+                await loop.run_in_executor(self._pool, spool.write, chunk)
+            else:
+                spool.write(chunk)
+        return True
+
+    def _handle(self, spool, writer, served, peer):
+        """Run one BridgeHandler request (executor thread) → (keep_alive, served)."""
+        handler = BridgeHandler.__new__(BridgeHandler)
+        handler.server = self
+        handler.client_address = peer
+        handler.request = handler.connection = None
+        handler.rfile = handler._raw_rfile = spool
+        handler.wfile = _LoopWriter(self.loop, writer)
+        handler._served = served
+        handler._body = None
+        handler.close_connection = True
+        handler.handle_expect_100 = lambda: True  # already answered on the loop
+        handler.handle_one_request()
+        return not handler.close_connection, handler._served
+
+    async def _stream_filaments(self, writer, path, headers):
+        """SSE on the loop: feed callbacks hop over with call_soon_threadsafe."""
+        import asyncio
+        from urllib.parse import parse_qs, urlparse
+        slicer = parse_qs(urlparse(path).query).get('slicer', ['bambu'])[0]
+        slicer = slicer if slicer in ('bambu', 'orca') else 'bambu'
+        lines = ['HTTP/1.1 200 OK',
+                 'Content-Type: text/event-stream; charset=utf-8',
+                 'Cache-Control: no-cache',
+                 'Connection: close']
+        lines += [f'{name}: {value}' for name, value in cors_headers(headers.get('Origin', ''))]
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+
+        loop = asyncio.get_running_loop()
+        events = asyncio.Queue()
+        last_sent = headers.get('Last-Event-ID', '')
+        unsubscribe = get_filament_feed(slicer).subscribe(
+            lambda digest, payload: loop.call_soon_threadsafe(events.put_nowait, (digest, payload)))
+        try:
+            while True:
+                try:
+                    digest, payload = await asyncio.wait_for(events.get(), FEED_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    writer.write(b': keepalive\n\n')
+                    await writer.drain()
+                    continue
+                if digest == last_sent:
+                    continue
+                last_sent = digest
+                writer.write(sse_event(digest, payload))
+                await writer.drain()
+        finally:
+            unsubscribe()
 
 
-def run_server():
-    HTTPServer(('127.0.0.1', PORT), BridgeHandler).serve_forever()
+def start_async_server():
+    """--engine=asyncio counterpart of start_server()."""
+    try:
+        return AsyncBridgeServer(('127.0.0.1', PORT)).start()
+    except OSError as e:
+        print(f"[{APP_NAME}] Cannot listen on port {PORT}: {e}")
+        return None
 
 
 # =====================================================
 # System Tray
 # =====================================================
 def create_tray_icon():
+    """Build the tray icon without its image; show_tray_icon() renders it
+    from the pystray setup thread so the menu loop starts immediately."""
     try:
         import pystray
 
-        icon_img = create_keycap_icon_from_svg(64)
-
         def on_healthcheck(icon, item):
             import webbrowser
             webbrowser.open(f"http://localhost:{PORT}/health")
@@ -1769,6 +4922,7 @@ def create_tray_icon():
 
         def on_quit(icon, item):
             icon.stop()
+            save_state_snapshot()
             os._exit(0)
 
         menu = pystray.Menu(
@@ -1782,17 +4936,88 @@ def create_tray_icon():
             pystray.MenuItem("終了", on_quit),
         )
 
-        return pystray.Icon(APP_NAME, icon_img, f"{APP_NAME} - Port {PORT}", menu)
+        return pystray.Icon(APP_NAME, None, f"{APP_NAME} - Port {PORT}", menu)
     except Exception as e:
         print(f"[{APP_NAME}] Tray icon failed: {e}")
         return None
 
 
+def show_tray_icon(icon):
+    icon.icon = create_keycap_icon_from_svg(64)
+    icon.visible = True
+    startup_trace('tray icon rendered')
+
+
 # =====================================================
 # Main
 # =====================================================
+_startup = {'trace': False, 'last': 0.0}
+_import_trace = threading.local()
+
+
+def startup_trace(phase):
+    """--startup-trace: print ms since the module started loading and since
+    the previous mark."""
+    if not _startup['trace']:
+        return
+    now = (time.perf_counter() - _STARTUP_T0) * 1000
+    delta, _startup['last'] = now - _startup['last'], now
+    print(f"[startup] {now:8.1f} ms (+{delta:6.1f})  {phase}")
+
+
+def _trace_imports():
+    """Time every import that first runs after startup (the deferred ones:
+    zipfile, xml, PIL, pystray, ...). Nested imports count towards the
+    outermost one."""
+    import builtins
+    real_import = builtins.__import__
+
+    def traced(name, globals=None, locals=None, fromlist=(), level=0):
+        mod = sys.modules.get(name)
+        loaded = mod is not None and all(f == '*' or hasattr(mod, f) for f in fromlist or ())
+        if level or loaded or getattr(_import_trace, 'active', False):
+            return real_import(name, globals, locals, fromlist, level)
+        _import_trace.active = True
+        t0 = time.perf_counter()
+        try:
+            return real_import(name, globals, locals, fromlist, level)
+        finally:
+            _import_trace.active = False
+            startup_trace(f"import {name} ({(time.perf_counter() - t0) * 1000:.1f} ms)")
+
+    builtins.__import__ = traced
+
+
+def _warm_up(silent):
+    """Background startup work that must not delay the listener."""
+    for name, stype in [("Bambu Studio", "bambu"), ("OrcaSlicer", "orca")]:
+        path = find_slicer(stype)
+        startup_trace(f'{stype} slicer resolved')
+        if not silent:
+            mark = "✓" if path else "✗"
+            print(f"  {mark} {name}: {path or 'not found'}")
+
+
 def main():
     silent = '--silent' in sys.argv
+    _startup['trace'] = '--startup-trace' in sys.argv
+    startup_trace('module imported')
+    if _startup['trace']:
+        _trace_imports()
+
+    # The snapshot is a small JSON read; load it before serving so the first
+    # request after boot is answered from it rather than racing the load
+    load_state_snapshot()
+    startup_trace('state snapshot loaded')
+
+    # Listen next so the browser never sees "bridge not connected" at login
+    os.makedirs(TEMP_DIR, exist_ok=True)
+    if '--engine=asyncio' in sys.argv:
+        server = start_async_server()
+    else:
+        server = start_server()
+    startup_trace('listening' if server else 'listen failed')
+
     config = load_config()
 
     # First run installer
@@ -1813,30 +5038,24 @@ def main():
         elif result["action"] != "cancel":
             sys.exit(0)
 
-    # Banner
+    # Banner (slicer detection lines follow from the warm-up thread)
     if not silent:
         print(f"{'=' * 50}")
         print(f"  {APP_NAME} v{VERSION}")
         print(f"  http://127.0.0.1:{PORT}")
         print(f"{'=' * 50}")
-        for name, stype in [("Bambu Studio", "bambu"), ("OrcaSlicer", "orca")]:
-            path = find_slicer(stype)
-            mark = "✓" if path else "✗"
-            print(f"  {mark} {name}: {path or 'not found'}")
-        print()
+        if server:
+            print(f"  Server started on port {PORT}")
 
-    os.makedirs(TEMP_DIR, exist_ok=True)
-
-    server_thread = threading.Thread(target=run_server, daemon=True)
-    server_thread.start()
-    if not silent:
-        print(f"  Server started on port {PORT}")
+    atexit.register(save_state_snapshot)
+    threading.Thread(target=_warm_up, args=(silent,), daemon=True).start()
 
     icon = create_tray_icon()
+    startup_trace('tray created')
     if icon:
         if not silent:
             print(f"  Tray icon active")
-        icon.run()
+        icon.run(setup=show_tray_icon)
     else:
         if not silent:
             print(f"  Console mode (Ctrl+C to quit)")
@@ -0,0 +1,286 @@
+"""HTTP behaviour shared by both server engines, plus the pure-data helpers
+(conf tokenizer, colour k-d tree, preset catalog) against naive references."""
+import gzip
+import http.client
+import json
+import os
+import random
+import struct
+import subprocess
+import tempfile
+import threading
+import zipfile
+
+import pytest
+
+import keycap_slicer_bridge as ksb
+
+ORIGIN = {'Origin': 'https://keycapgenerator.com'}
+BOUNDARY = 'KsbTestBoundary'
+
+_CACHES = ('_paint_usage_cache', '_preset_dir_cache', '_preset_indexes', '_preset_catalogs',
+           '_background_results', '_last_results', '_warm_results', '_candidate_index',
+           '_preset_color_cache', '_color_indexes', '_slicer_registry', '_feeds', '_uploads')
+
+
+def _reset_state():
+    for name in _CACHES:
+        getattr(ksb, name).clear()
+    with ksb._state_lock:
+        if ksb._state['timer'] is not None:
+            ksb._state['timer'].cancel()
+        ksb._state.update(dirty=False, timer=None)
+
+
+@pytest.fixture
+def bridge(tmp_path, monkeypatch):
+    """The module pointed at a throwaway APPDATA / profile / temp tree, with
+    the slicer launch recorded instead of run."""
+    appdata = tmp_path / 'appdata'
+    home = tmp_path / 'home'
+    temp = tmp_path / 'temp'
+    for d in (appdata / 'BambuStudio', home / 'Desktop', temp):
+        d.mkdir(parents=True)
+    monkeypatch.setenv('APPDATA', str(appdata))
+    monkeypatch.setenv('USERPROFILE', str(home))
+    monkeypatch.setattr(tempfile, 'tempdir', str(temp))
+    install = tmp_path / 'install'
+    bridge_temp = temp / 'keycap-slicer-bridge'
+    bridge_temp.mkdir()
+    monkeypatch.setattr(ksb, 'INSTALL_DIR', str(install))
+    monkeypatch.setattr(ksb, 'STATE_FILE', str(install / 'state.json'))
+    monkeypatch.setattr(ksb, 'TEMP_DIR', str(bridge_temp))
+    monkeypatch.setattr(ksb, 'UPLOAD_DIR', str(bridge_temp / 'uploads'))
+    monkeypatch.setattr(ksb, 'find_slicer', lambda slicer_type: 'slicer.exe')
+    launched = []
+    monkeypatch.setattr(subprocess, 'Popen', lambda args: launched.append(args))
+    _reset_state()
+    yield {'appdata': appdata, 'home': home, 'launched': launched}
+    _reset_state()
+
+
+def write_conf(bridge, colors, names):
+    conf = {'app': {}, 'presets': {'filament_colors': colors, 'filaments': names}}
+    path = bridge['appdata'] / 'BambuStudio' / 'BambuStudio.conf'
+    path.write_text(json.dumps(conf) + '\n# MD5 checksum 0123\n', encoding='utf-8')
+
+
+@pytest.fixture(params=['thread', 'asyncio'])
+def server(request, bridge):
+    """Port of a running server on the requested engine."""
+    if request.param == 'asyncio':
+        srv = ksb.AsyncBridgeServer(('127.0.0.1', 0)).start()
+    else:
+        srv = ksb.ThreadingHTTPServer(('127.0.0.1', 0), ksb.BridgeHandler)
+        srv.daemon_threads = True
+        threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield srv.server_address[1]
+    srv.shutdown()
+    if request.param == 'thread':
+        srv.server_close()
+
+
+def fetch(port, method, path, body=None, headers=None, conn=None):
+    """→ (status, headers, body); reuses conn when given."""
+    c = conn or http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    c.request(method, path, body=body, headers=dict(ORIGIN, **(headers or {})))
+    r = c.getresponse()
+    data = r.read()
+    if conn is None:
+        c.close()
+    return r.status, {k.lower(): v for k, v in r.getheaders()}, data
+
+
+def multipart(fields, filename, data, part_headers=''):
+    out = b''
+    for name, value in fields.items():
+        out += (f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n'
+                f'{value}\r\n').encode()
+    out += (f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="file"; '
+            f'filename="{filename}"\r\n{part_headers}\r\n').encode() + data + b'\r\n'
+    out += f'--{BOUNDARY}--\r\n'.encode()
+    return out, {'Content-Type': f'multipart/form-data; boundary={BOUNDARY}'}
+
+
+def ascii_stl(n=200):
+    facets = []
+    for i in range(n):
+        a, b, c = (i, 0, 0), (i + 1, 0, 0), (i, 1, 0)
+        facets.append('facet normal 0 0 1\n outer loop\n' +
+                      ''.join(f'  vertex {x} {y} {z}\n' for x, y, z in (a, b, c)) +
+                      ' endloop\nendfacet\n')
+    return ('solid t\n' + ''.join(facets) + 'endsolid t\n').encode()
+
+
+# ── HTTP (both engines) ──
+
+def test_filaments_etag_and_304(server, bridge):
+    write_conf(bridge, '#FF0000,#00FF00', ['Bambu PLA Basic @BBL X1C', 'Generic PETG'])
+    status, headers, body = fetch(server, 'GET', '/project-filaments?debug=0')
+    assert status == 200
+    result = json.loads(body)
+    assert [f['color'] for f in result['filaments']] == ['#FF0000', '#00FF00']
+    etag = headers['etag']
+    assert etag.startswith('W/"')
+
+    status, headers, body = fetch(server, 'GET', '/project-filaments?debug=0',
+                                  headers={'If-None-Match': etag})
+    assert (status, body) == (304, b'')
+    # The debug tree differs between scans but does not change the tag
+    status, headers, _ = fetch(server, 'GET', '/project-filaments',
+                               headers={'If-None-Match': etag})
+    assert status == 304
+
+    write_conf(bridge, '#0000FF,#00FF00', ['Bambu PLA Basic @BBL X1C', 'Generic PETG'])
+    status, headers, _ = fetch(server, 'GET', '/project-filaments?debug=0',
+                               headers={'If-None-Match': etag})
+    assert status == 200 and headers['etag'] != etag
+
+
+def test_keep_alive(server):
+    conn = http.client.HTTPConnection('127.0.0.1', server, timeout=10)
+    try:
+        status, headers, _ = fetch(server, 'GET', '/health', conn=conn)
+        sock = conn.sock
+        assert status == 200 and 'keep-alive' in headers
+        for _ in range(3):
+            status, headers, _ = fetch(server, 'GET', '/health', conn=conn)
+            assert status == 200 and headers.get('connection') != 'close'
+            assert conn.sock is sock
+    finally:
+        conn.close()
+
+
+def test_chunked_upload_resume_and_commit(server, bridge):
+    data = os.urandom(10000)
+    status, _, body = fetch(server, 'POST', '/upload',
+                            json.dumps({'filename': 'part.3mf', 'size': len(data), 'slicer': 'orca'}),
+                            {'Content-Type': 'application/json'})
+    assert status == 201
+    uid = json.loads(body)['upload_id']
+    # Chunks out of order; the session reports what is still missing
+    assert fetch(server, 'PUT', f'/upload/{uid}?offset=6000', data[6000:])[0] == 200
+    status, _, body = fetch(server, 'POST', f'/upload/{uid}/commit')
+    assert status == 409 and json.loads(body)['received'] == [[6000, 10000]]
+    assert fetch(server, 'PUT', f'/upload/{uid}?offset=0', data[:6000])[0] == 200
+    status, _, body = fetch(server, 'GET', f'/upload/{uid}')
+    assert json.loads(body)['complete'] is True
+
+    status, _, body = fetch(server, 'POST', f'/upload/{uid}/commit')
+    assert status == 200 and json.loads(body)['file'] == 'part.3mf'
+    (args,) = bridge['launched']
+    with open(args[1], 'rb') as f:
+        assert f.read() == data
+
+
+@pytest.mark.parametrize('encoding', ['request-gzip', 'request-deflate', 'part-gzip', 'gz-name'])
+def test_compressed_open(server, bridge, encoding):
+    stl = ascii_stl()
+    if encoding == 'part-gzip':
+        body, headers = multipart({'slicer': 'bambu'}, 'k.stl', gzip.compress(stl),
+                                  'Content-Encoding: gzip\r\n')
+    elif encoding == 'gz-name':
+        body, headers = multipart({'slicer': 'bambu'}, 'k.stl.gz', gzip.compress(stl))
+    else:
+        body, headers = multipart({'slicer': 'bambu'}, 'k.stl', stl)
+        if encoding == 'request-gzip':
+            body, headers['Content-Encoding'] = gzip.compress(body), 'gzip'
+        else:
+            import zlib
+            body, headers['Content-Encoding'] = zlib.compress(body), 'deflate'
+    status, _, resp = fetch(server, 'POST', '/open', body, headers)
+    assert status == 200, resp
+    (args,) = bridge['launched']
+    assert os.path.basename(args[1]) == 'k.stl'
+    with open(args[1], 'rb') as f:
+        assert f.read() == stl
+
+
+def test_open_limits_decoded_size(server, bridge, monkeypatch):
+    monkeypatch.setattr(ksb, 'MAX_UPLOAD_BYTES', 1000)
+    body, headers = multipart({}, 'k.stl', gzip.compress(b'solid ' + b' ' * 100000),
+                              'Content-Encoding: gzip\r\n')
+    assert fetch(server, 'POST', '/open', body, headers)[0] == 413
+    assert not os.path.exists(os.path.join(ksb.TEMP_DIR, 'k.stl'))
+    # identity: nothing is decoded, so the .gz name is kept (and refused)
+    body, headers = multipart({}, 'k.stl.gz', b'x', 'Content-Encoding: identity\r\n')
+    assert fetch(server, 'POST', '/open', body, headers)[0] == 400
+
+
+def test_open_converts_stl_to_3mf(server, bridge):
+    body, headers = multipart({'slicer': 'bambu', 'convert': '3mf', 'colors': '#FF0000,#00FF00'},
+                              'k.stl', ascii_stl())
+    status, _, resp = fetch(server, 'POST', '/open', body, headers)
+    assert status == 200 and json.loads(resp)['converted'] is True
+    (args,) = bridge['launched']
+    assert args[1].endswith('k.3mf')
+    filaments, source = ksb._extract_all_from_3mf(args[1])[:2]
+    assert source == '3dmodel_basematerials'
+    assert [f.color for f in filaments] == ['#FF0000', '#00FF00']
+
+
+def test_stl_readers_dedupe_vertices(tmp_path):
+    tris = [((0, 0, 0), (1, 0, 0), (0, 1, 0)), ((1, 0, 0), (1, 1, 0), (0, 1, 0))]
+    binary = tmp_path / 'b.stl'
+    with open(binary, 'wb') as f:
+        f.write(b'\0' * 80 + struct.pack('<I', len(tris)))
+        for t in tris:
+            f.write(struct.pack('<12fH', 0, 0, 1, *t[0], *t[1], *t[2], 0))
+    verts, idx = ksb._read_stl(str(binary))
+    assert (len(verts) // 3, list(idx)) == (4, [0, 1, 2, 1, 3, 2])
+    obj = tmp_path / 'o.obj'
+    obj.write_bytes(b'v\t0 0 0\nv 1 0 0\nv 1 1 0\nv 0 1 0\nvn 0 0 1\nf 1/1 2/2 3/3 4/4\n')
+    verts, idx = ksb._read_obj(str(obj))
+    assert (len(verts) // 3, list(idx)) == (4, [0, 1, 2, 0, 2, 3])
+
+
+# ── Pure helpers ──
+
+@pytest.mark.parametrize('doc', [
+    {},
+    {'presets': {'filament_colors': '#FFFFFF,#000000', 'filaments': ['A', None]}},
+    {'app': {'last_backup_path': 'C:/x/y'}, 'n': [1, 2.5, -3e2, True, None], 's': 'é "q" \\'},
+    {'orca_presets': [{'machine': 'X1C', 'filament_colors': '#A;#B'}], 'nested': {'a': {'b': []}}},
+])
+@pytest.mark.parametrize('tail', ['', '\n# MD5 checksum ABCDEF\n', '\n[presets]\nfilament = PLA\n'])
+def test_tokenizer_matches_json_loads(doc, tail):
+    text = json.dumps(doc, indent=1, ensure_ascii=False) + tail
+    tokens = ksb.tokenize_conf(text)
+    assert tokens['json'] == json.loads(json.dumps(doc))
+    assert tokens['json_error'] is None
+    if '[presets]' in tail:
+        assert tokens['sections'] == {'presets': {'filament': 'PLA'}}
+
+
+def test_color_index_matches_brute_force():
+    rnd = random.Random(26)
+    rows = [[f'P{i}', '#%06X' % rnd.randrange(0x1000000), 'PLA', ''] for i in range(300)]
+    index = ksb.ColorIndex(rows)
+    labs = {row[0]: ksb.hex_to_lab(row[1]) for row in rows}
+    for _ in range(50):
+        q = '#%06X' % rnd.randrange(0x1000000)
+        ql = ksb.hex_to_lab(q)
+        brute = sorted(sum((a - b) ** 2 for a, b in zip(ql, labs[row[0]])) ** 0.5 for row in rows)
+        found = index.nearest(q, k=5)
+        assert [round(d, 6) for d, _ in found] == [round(d, 6) for d in brute[:5]]
+    assert index.nearest_many(['#FF0000', '#00FF00', '#FF0000']) == \
+        [index.nearest('#FF0000'), index.nearest('#00FF00'), index.nearest('#FF0000')]
+
+
+def test_preset_catalog_search_matches_filter():
+    rnd = random.Random(46)
+    words = ['Bambu', 'PLA', 'Basic', 'Matte', 'PETG', 'HF', 'Silk', 'Generic', 'ELEGOO']
+    rows = [[' '.join(rnd.sample(words, 3)) + f' {i} @BBL X1C', '#FFFFFF',
+             rnd.choice(['PLA', 'PETG']), rnd.choice(['Bambu Lab', 'Generic'])] for i in range(200)]
+    catalog = ksb.PresetCatalog(rows)
+    ordered = sorted(rows, key=lambda r: ksb._preset_key(r[0]))
+    for q, match, vendor in [('', 'prefix', ''), ('bambu', 'prefix', ''), ('pla', 'substring', ''),
+                             ('silk matte', 'substring', 'generic'), ('zzz', 'substring', '')]:
+        key = ksb._preset_key(q)
+        expected = [r for r in ordered
+                    if (ksb._preset_key(r[0]).startswith(key) if match == 'prefix'
+                        else key in ksb._preset_key(r[0]))
+                    and (not vendor or r[3].lower() == vendor)]
+        total, page = catalog.search(q, match=match, vendor=vendor, limit=10, offset=5)
+        assert total == len(expected)
+        assert page == expected[5:15]
@@ -0,0 +1,68 @@
+"""Icon sizes derived from one large render stay within
+ICON_DERIVE_TOLERANCE of rendering each size directly."""
+import os
+
+import pytest
+
+pytest.importorskip('PIL')
+from PIL import ImageChops, ImageStat
+
+import generate_icon
+import keycap_slicer_bridge as ksb
+
+SVG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                        'keycapgeneratorIcon.svg')
+
+
+def mean_diff(a, b):
+    assert a.size == b.size
+    return max(ImageStat.Stat(ImageChops.difference(a.convert('RGBA'), b.convert('RGBA'))).mean)
+
+
+def require_cairosvg():
+    try:
+        import cairosvg  # noqa: F401
+    except (ImportError, OSError) as e:
+        # OSError: the package is installed but the cairo library is not
+        pytest.skip(f'cairosvg unavailable: {e}')
+
+
+def assert_within_tolerance(derived, render, sizes):
+    for size, img in zip(sizes, derived):
+        diff = mean_diff(img, render(size))
+        assert diff <= ksb.ICON_DERIVE_TOLERANCE, f'{size}px: mean diff {diff:.2f}'
+
+
+def test_derive_icon_sizes_shapes():
+    master = ksb.create_keycap_icon(256)
+    derived = ksb.derive_icon_sizes(master, ksb.ICON_SIZES)
+    assert sorted(derived) == sorted(ksb.ICON_SIZES)
+    for size, img in derived.items():
+        assert img.size == (size, size)
+    assert derived[256].tobytes() == master.tobytes()
+
+
+def test_pil_sizes_match_direct_renders():
+    derived = ksb.render_icon_sizes(ksb.ICON_SIZES, render=ksb.create_keycap_icon)
+    assert_within_tolerance(derived, ksb.create_keycap_icon, ksb.ICON_SIZES)
+
+
+def test_bridge_cairosvg_sizes_match_direct_renders():
+    require_cairosvg()
+
+    def render(size):
+        img, renderer = ksb._render_keycap_icon_from_svg(size)
+        assert renderer == 'cairo'
+        return img
+
+    derived = ksb.render_icon_sizes(ksb.ICON_SIZES, render=render)
+    assert_within_tolerance(derived, render, ksb.ICON_SIZES)
+
+
+def test_generate_icon_cairosvg_sizes_match_direct_renders():
+    require_cairosvg()
+    with open(SVG_PATH, 'rb') as f:
+        svg_data = f.read()
+    derived = generate_icon.cairosvg_icon_sizes(svg_data, generate_icon.SIZES)
+    assert_within_tolerance(derived, lambda size: generate_icon.render_svg(svg_data, size),
+                            generate_icon.SIZES)